@@ -1,16 +1,36 @@
 from flask import Flask, request, jsonify
-import hashlib
-import json
+import base64
+import orjson
 import time
-from eth_account import Account
-from web3 import Web3
+import coincurve
+from eth_account.messages import encode_defunct
+from eth_hash.auto import keccak
+from eth_utils import to_canonical_address
+from hexbytes import HexBytes
 import threading
+from collections import deque
 from datetime import datetime
 import os
 from metrics_manager import BlockchainMetricsManager
 
 app = Flask(__name__)
 
+CACHE_SHARDS = 16
+CACHE_TTL = 3600  # 1 hour window
+
+# A 65-byte signature is 88 chars in base64 and 130/132 in hex
+BASE64_SIGNATURE_LENGTH = 88
+
+# libsecp256k1 context shared by every recovery in a process
+SECP256K1_CONTEXT = coincurve.GLOBAL_CONTEXT
+
+def recover_address_bytes(message_hash, signature_bytes):
+    """Recover the 20-byte signer address from a hash and 65-byte signature"""
+    public_key = coincurve.PublicKey.from_signature_and_message(
+        signature_bytes, message_hash, hasher=None, context=SECP256K1_CONTEXT
+    )
+    return keccak(public_key.format(compressed=False)[1:])[-20:]
+
 class BlockchainService:
     def __init__(self):
         # Initialize paths
@@ -19,15 +39,15 @@ class BlockchainService:
         
         # Initialize blockchain state
         self.services = {}  # Registered services
-        self.message_cache = {}  # Message cache for replay protection
+        # Message cache for replay protection, sharded by replay key hash
+        self.cache_shards = [dict() for _ in range(CACHE_SHARDS)]
+        self.cache_locks = [threading.Lock() for _ in range(CACHE_SHARDS)]
+        self.cache_order = deque()  # (monotonic time, key, shard) in insertion order
         self.locks = {
             'services': threading.Lock(),
-            'cache': threading.Lock()
+            'cache_order': threading.Lock()
         }
         
-        # Initialize Web3
-        self.web3 = Web3()
-        
         # Initialize metrics manager
         self.metrics_enabled = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
         if self.metrics_enabled:
@@ -37,68 +57,82 @@ class BlockchainService:
 
     def register_service(self, service_id, public_key):
         """Register a new service"""
+        start_time = time.time()
+        entry = {
+            'public_key': public_key,
+            'public_key_bytes': to_canonical_address(public_key),
+            'registered_at': datetime.now().isoformat(),
+            'last_seen': datetime.now().isoformat()
+        }
+        
+        # Copy-on-write: readers use self.services without locking, so
+        # writers publish a new dict instead of mutating the shared one
         with self.locks['services']:
-            start_time = time.time()
-            
-            # Register service
-            self.services[service_id] = {
-                'public_key': public_key,
-                'registered_at': datetime.now().isoformat(),
-                'last_seen': datetime.now().isoformat()
-            }
-            
-            # Record metrics if enabled
-            if self.metrics_enabled:
-                self.metrics_manager.record_delay(
-                    source_service=service_id,
-                    destination_service='blockchain',
-                    packet_id=f"reg-{service_id}",
-                    packet_size=len(public_key),
-                    delay_ms=(time.time() - start_time) * 1000,
-                    blockchain_enabled=True
-                )
-            
-            return True
+            services = dict(self.services)
+            services[service_id] = entry
+            self.services = services
+        
+        # Record metrics if enabled
+        if self.metrics_enabled:
+            self.metrics_manager.record_delay(
+                source_service=service_id,
+                destination_service='blockchain',
+                packet_id=f"reg-{service_id}",
+                packet_size=len(public_key),
+                delay_ms=(time.time() - start_time) * 1000,
+                blockchain_enabled=True
+            )
+        
+        return True
 
     def verify_message(self, message_data, signature, sender_id):
         """Verify a message's authenticity"""
         start_time = time.time()
         
         try:
-            if sender_id not in self.services:
+            service = self.services.get(sender_id)
+            if service is None:
+                return False
+            
+            # Verify timestamp (5 minute window)
+            timestamp = message_data['timestamp']
+            if abs(int(start_time) - timestamp) > 300:
                 return False
             
-            # Create message hash
-            message_hash = hashlib.sha256(
-                f"{sender_id}{message_data['timestamp']}".encode()
-            ).hexdigest()
+            # Canonical bytes are shared by the hash, the replay key and
+            # the size metric
+            canonical = orjson.dumps(message_data, option=orjson.OPT_SORT_KEYS)
+            signed_hash = keccak(canonical)
             
-            with self.locks['cache']:
+            # Replay key: each distinct signed message is accepted once, so
+            # several messages a sender signs within one second all pass
+            replay_key = (sender_id, signed_hash)
+            shard = hash(replay_key) & (CACHE_SHARDS - 1)
+            cached_at = time.monotonic()
+            with self.cache_locks[shard]:
                 # Prevent replay attacks
-                if message_hash in self.message_cache:
+                if replay_key in self.cache_shards[shard]:
                     return False
                 
-                # Verify timestamp (5 minute window)
-                if abs(int(time.time()) - message_data['timestamp']) > 300:
-                    return False
-                
-                # Cache message hash
-                self.message_cache[message_hash] = time.time()
-                self._clean_message_cache()
+                # Cache replay key
+                self.cache_shards[shard][replay_key] = cached_at
+            
+            with self.locks['cache_order']:
+                self.cache_order.append((cached_at, replay_key, shard))
+            self._clean_message_cache()
             
             # Verify signature
             try:
-                signed_hash = self.web3.keccak(text=json.dumps(message_data, sort_keys=True))
-                recovered_address = Account.recover_message(signed_hash, signature=signature)
-                is_valid = recovered_address.lower() == self.services[sender_id]['public_key'].lower()
+                recovered_address = self._recover_address_bytes(signed_hash, signature)
+                is_valid = recovered_address == service['public_key_bytes']
                 
                 # Record metrics if enabled
                 if self.metrics_enabled:
                     self.metrics_manager.record_delay(
                         source_service=sender_id,
                         destination_service='blockchain',
-                        packet_id=message_hash[:8],
-                        packet_size=len(json.dumps(message_data)),
+                        packet_id=f"{sender_id}-{timestamp}",
+                        packet_size=len(canonical),
                         delay_ms=(time.time() - start_time) * 1000,
                         blockchain_enabled=True
                     )
@@ -113,15 +147,34 @@ class BlockchainService:
             print(f"Error verifying message: {str(e)}")
             return False
 
+    def _recover_address_bytes(self, signed_hash, signature):
+        """Recover the 20-byte signer address of an EIP-191 signed hash"""
+        # EIP-191 version E: keccak over 0x19, version, header and body
+        signable = encode_defunct(primitive=signed_hash)
+        message_hash = keccak(b'\x19' + signable.version + signable.header + signable.body)
+        if len(signature) == BASE64_SIGNATURE_LENGTH:
+            raw_signature = bytes(base64.b64decode(signature))
+        else:
+            raw_signature = bytes(HexBytes(signature))
+        # Recovery id is 0/1; Ethereum signatures carry it as v = 27/28
+        v = raw_signature[64]
+        signature_bytes = raw_signature[:64] + bytes([v - 27 if v >= 27 else v])
+        # Inline: coincurve releases the GIL, and one recovery is cheaper
+        # than a process pool's pickling and IPC round trip
+        return recover_address_bytes(message_hash, signature_bytes)
+
     def _clean_message_cache(self):
         """Clean old messages from cache"""
-        current_time = time.time()
-        with self.locks['cache']:
-            self.message_cache = {
-                msg_id: timestamp 
-                for msg_id, timestamp in self.message_cache.items() 
-                if current_time - timestamp < 3600  # 1 hour window
-            }
+        cutoff = time.monotonic() - CACHE_TTL
+        expired = []
+        with self.locks['cache_order']:
+            # Entries are time-ordered, so only the expired head is touched
+            while self.cache_order and self.cache_order[0][0] < cutoff:
+                expired.append(self.cache_order.popleft())
+        
+        for _, msg_id, shard in expired:
+            with self.cache_locks[shard]:
+                self.cache_shards[shard].pop(msg_id, None)
 
     def record_metrics(self):
         """Record service metrics"""
@@ -195,6 +248,45 @@ def verify_message():
             'message': str(e)
         }), 500
 
+@app.route('/verify_batch', methods=['POST'])
+def verify_batch():
+    """Verify several messages' authenticity in one request"""
+    try:
+        messages = request.json.get('messages')
+        
+        if not isinstance(messages, list):
+            return jsonify({
+                'status': 'error',
+                'message': 'Missing required fields'
+            }), 400
+        
+        results = []
+        for item in messages:
+            # A malformed entry is invalid on its own, not a failed batch
+            if not isinstance(item, dict):
+                results.append(False)
+                continue
+            
+            message_data = item.get('message')
+            signature = item.get('signature')
+            sender_id = item.get('sender_id')
+            
+            results.append(bool(
+                all([message_data, signature, sender_id]) and
+                app.blockchain_service.verify_message(message_data, signature, sender_id)
+            ))
+        
+        return jsonify({
+            'status': 'success',
+            'is_valid': results
+        }), 200
+        
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -210,7 +302,8 @@ def start_metrics_recording():
             print(f"Error recording metrics: {str(e)}")
             time.sleep(10)
 
-if __name__ == "__main__":
+def init_service():
+    """Create the blockchain service and its background threads"""
     # Initialize blockchain service
     app.blockchain_service = BlockchainService()
     
@@ -219,6 +312,9 @@ if __name__ == "__main__":
         metrics_thread = threading.Thread(target=start_metrics_recording)
         metrics_thread.daemon = True
         metrics_thread.start()
+
+if __name__ == "__main__":
+    init_service()
     
     # Start Flask server
     print("Starting Blockchain Service...")
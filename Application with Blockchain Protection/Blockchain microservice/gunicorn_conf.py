@@ -0,0 +1,15 @@
+import os
+
+bind = '0.0.0.0:30083'
+
+# The service registry and replay cache live in process memory, so every
+# request must reach the same worker. Concurrency comes from worker threads;
+# signature recovery in coincurve runs without holding the GIL.
+workers = 1
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+def post_fork(server, worker):
+    """Build the service inside the worker, after the fork"""
+    from blockchain_service import init_service
+    init_service()
@@ -1,17 +1,114 @@
 #!/usr/bin/env python3
 
+import base64
 import cv2
+import hashlib
 import time
-import json
+import orjson
 import os
+import atexit
+import csv
+import psutil
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import signal
 import sys
 import socket
 import struct
 import threading
 from queue import Queue
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from web3 import Web3
+from itertools import groupby
+from eth_hash.auto import keccak
 from eth_account import Account
+from eth_account.messages import encode_defunct
+
+def sendmsg_all(sock, buffers):
+    """Send buffers in one scatter-gather call, resuming after partial writes"""
+    views = [memoryview(buf).cast('B') for buf in buffers]
+    while views:
+        sent = sock.sendmsg(views)
+        while views and sent >= len(views[0]):
+            sent -= len(views[0])
+            views.pop(0)
+        if views and sent:
+            views[0] = views[0][sent:]
+
+def frame_buffers(data):
+    """Size-prefix string, bytes or JSON dict data; returns (buffers, size)"""
+    if isinstance(data, dict):
+        data = orjson.dumps(data)
+    elif isinstance(data, str):
+        data = data.encode()
+    
+    size = len(data)
+    return [struct.pack('!I', size), data], size
+
+RECV_CHUNK_SIZE = 64 * 1024
+
+# Verdicts a BlockchainClient keeps for repeated invalid messages
+REJECTED_CACHE_SIZE = 4096
+
+# Seconds a rejection is trusted; a sender that was not yet registered
+# must be able to get the same message accepted once it has
+REJECTED_CACHE_TTL = 30
+
+# Signed binary header for send_raw: timestamp, payload size,
+# NUL-padded sender id, SHA-256 of the payload and the 65-byte
+# signature over all of the above
+RAW_SENDER_ID_SIZE = 16
+RAW_HEADER = struct.Struct(f'!QI{RAW_SENDER_ID_SIZE}s32s65s')
+
+_recv_buffers = threading.local()
+
+def recv_into_view(sock, view):
+    """Fill view from sock, returning the byte count received before EOF"""
+    size = len(view)
+    received = 0
+    
+    while received < size:
+        n = sock.recv_into(view[received:], min(size - received, RECV_CHUNK_SIZE))
+        if not n:
+            break
+        received += n
+        
+    return received
+
+def recv_exact(sock, size):
+    """Receive up to size bytes directly into one preallocated buffer"""
+    buf = bytearray(size)
+    with memoryview(buf) as view:
+        received = recv_into_view(sock, view)
+    
+    # Trim to what actually arrived if the peer closed early
+    if received < size:
+        del buf[received:]
+    return buf
+
+def read_framed(sock):
+    """Read one size-prefixed frame into this thread's reusable buffer
+    
+    Returns a memoryview that is only valid until the next call on the
+    same thread, or None if the connection closed mid-frame.
+    """
+    size_data = recv_exact(sock, 4)
+    if len(size_data) < 4:
+        return None
+        
+    size = struct.unpack('!I', size_data)[0]
+    
+    # Grow by replacing the buffer so views handed out earlier stay valid
+    buf = getattr(_recv_buffers, 'buf', None)
+    if buf is None or len(buf) < size:
+        buf = _recv_buffers.buf = bytearray(size)
+        
+    view = memoryview(buf)[:size]
+    if recv_into_view(sock, view) < size:
+        return None
+    return view
 
 # Implementation of Socket classes
 class StandardSocket:
@@ -21,59 +118,46 @@ class StandardSocket:
         self.socket = socket
     
     def send(self, data):
-        """Send string data"""
-        if isinstance(data, str):
-            data = data.encode()
-        
+        """Send string, bytes or JSON dict data; returns the payload size"""
         # Send with size prefix for framing
-        size = len(data)
-        self.socket.sendall(struct.pack('!I', size))
-        self.socket.sendall(data)
+        buffers, size = frame_buffers(data)
+        sendmsg_all(self.socket, buffers)
+        return size
     
     def send_raw(self, data):
         """Send raw binary data without size prefix"""
         self.socket.sendall(data)
     
+    def send_frames(self, data, raw_data):
+        """Send a message and its raw payload in one scatter-gather write"""
+        buffers, size = frame_buffers(data)
+        sendmsg_all(self.socket, buffers + [raw_data])
+        return size
+    
     def receive(self, max_size=None):
         """Receive string data with size prefix"""
-        # First read the 4-byte size
-        size_data = self.socket.recv(4)
-        if not size_data or len(size_data) < 4:
+        frame = read_framed(self.socket)
+        if frame is None:
             return None
             
-        size = struct.unpack('!I', size_data)[0]
-        
-        # Then read the payload
-        data = bytearray()
-        remaining = size
-        
-        while remaining > 0:
-            chunk = self.socket.recv(min(remaining, 4096))
-            if not chunk:
-                break
-            data.extend(chunk)
-            remaining -= len(chunk)
-            
-        return data.decode()
+        return str(frame, 'utf-8')
     
     def receive_raw(self, size):
         """Receive exact amount of binary data"""
-        data = bytearray()
-        remaining = size
-        
-        while remaining > 0:
-            chunk = self.socket.recv(min(remaining, 4096))
-            if not chunk:
-                break
-            data.extend(chunk)
-            remaining -= len(chunk)
-            
-        return bytes(data)
+        return recv_exact(self.socket, size)
 
 class SecureSocket:
     """Socket wrapper with blockchain security"""
     
     def __init__(self, blockchain_client, existing_socket=None):
+        # struct would silently truncate a longer id in raw headers, and
+        # the receiver would then verify them against the wrong sender
+        if (blockchain_client.enabled
+                and len(blockchain_client.service_id.encode()) > RAW_SENDER_ID_SIZE):
+            raise ValueError(
+                f"Service id {blockchain_client.service_id!r} is longer than the "
+                f"{RAW_SENDER_ID_SIZE} bytes a raw frame header can carry"
+            )
         self.blockchain_client = blockchain_client
         self.socket = existing_socket or socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     
@@ -104,94 +188,123 @@ class SecureSocket:
             raise Exception("Blockchain handshake failed")
     
     def send(self, data):
-        """Send data with blockchain security"""
+        """Send data with blockchain security; returns the payload size"""
+        buffers, size = self._message_buffers(data)
+        sendmsg_all(self.socket, buffers)
+        return size
+    
+    def send_raw(self, data):
+        """Send binary data with minimal blockchain overhead"""
+        sendmsg_all(self.socket, self._raw_buffers(data))
+    
+    def send_frames(self, data, raw_data):
+        """Send a signed message and its raw payload in one scatter-gather write"""
+        buffers, size = self._message_buffers(data)
+        sendmsg_all(self.socket, buffers + self._raw_buffers(raw_data))
+        return size
+    
+    def _message_buffers(self, data):
+        """Build the framed (and signed, if enabled) message; returns (buffers, size)"""
         if not self.blockchain_client.enabled:
             # Use StandardSocket behavior if blockchain disabled
-            if isinstance(data, str):
-                data = data.encode()
-            size = len(data)
-            self.socket.sendall(struct.pack('!I', size))
-            self.socket.sendall(data)
-            return
+            return frame_buffers(data)
             
-        # For text data, use secure JSON
-        if isinstance(data, str):
+        # Dicts are signed as-is; text is used as JSON when it parses
+        if isinstance(data, dict):
+            json_data = data
+        elif isinstance(data, (str, bytes)):
             try:
                 # Try to parse as JSON first
-                json_data = json.loads(data)
-                message_data = {
-                    'timestamp': int(time.time()),
-                    'data': json_data,
-                    'sender_id': self.blockchain_client.service_id
-                }
+                json_data = orjson.loads(data)
             except:
                 # Not JSON, treat as plain text
-                message_data = {
-                    'timestamp': int(time.time()),
-                    'data': data,
-                    'sender_id': self.blockchain_client.service_id
-                }
-                
-            signature = self.blockchain_client.sign_message(message_data)
-            wrapped_message = {
-                'message': message_data,
-                'signature': signature
-            }
+                json_data = data.decode() if isinstance(data, bytes) else data
+        else:
+            return [], 0
             
-            self._send_json(wrapped_message)
+        message_data = {
+            'timestamp': int(time.time()),
+            'data': json_data,
+            'sender_id': self.blockchain_client.service_id
+        }
+        
+        # Serialize once: the signed canonical bytes are spliced into the
+        # envelope, so the wire carries exactly what was hashed
+        payload = orjson.dumps(message_data, option=orjson.OPT_SORT_KEYS)
+        signature = self.blockchain_client.sign_bytes(payload)
+        wrapped_message = b''.join([
+            b'{"message":', payload, b',"signature":', orjson.dumps(signature), b'}'
+        ])
+        
+        return frame_buffers(wrapped_message)
     
-    def send_raw(self, data):
-        """Send binary data with minimal blockchain overhead"""
+    def _raw_buffers(self, data):
+        """Build the signed binary header and payload buffers for send_raw"""
         if not self.blockchain_client.enabled:
-            self.socket.sendall(data)
-            return
+            return [data]
             
-        # For binary data, we only sign the size and timestamp
-        # to avoid overhead of encoding binary data as JSON
+        # For binary data, one signature covers a digest of the payload,
+        # so the bytes are never encoded as JSON or signed piecewise
+        digest = hashlib.sha256(data).digest()
         header = {
             'timestamp': int(time.time()),
             'size': len(data),
-            'sender_id': self.blockchain_client.service_id
+            'sender_id': self.blockchain_client.service_id,
+            'digest': digest.hex()
         }
         
-        signature = self.blockchain_client.sign_message(header)
+        signature = self.blockchain_client.sign_raw(
+            orjson.dumps(header, option=orjson.OPT_SORT_KEYS)
+        )
         
-        # Send header with signature
-        header_with_sig = {
-            'header': header,
-            'signature': signature
+        # Fixed-size binary header, then raw data
+        header_bytes = RAW_HEADER.pack(
+            header['timestamp'],
+            header['size'],
+            header['sender_id'].encode(),
+            digest,
+            signature
+        )
+        return [header_bytes, data]
+    
+    def receive_raw(self, size=None):
+        """Receive binary data sent with send_raw and verify its header"""
+        if not self.blockchain_client.enabled:
+            return recv_exact(self.socket, size)
+            
+        header_bytes = recv_exact(self.socket, RAW_HEADER.size)
+        if len(header_bytes) < RAW_HEADER.size:
+            return None
+            
+        timestamp, size, sender_id, digest, signature = RAW_HEADER.unpack(header_bytes)
+        header = {
+            'timestamp': timestamp,
+            'size': size,
+            'sender_id': sender_id.rstrip(b'\0').decode(),
+            'digest': digest.hex()
         }
         
-        header_json = json.dumps(header_with_sig).encode()
-        header_size = len(header_json)
+        # Verify signature
+        if not self.blockchain_client.verify_signature(header, base64.b64encode(signature).decode()):
+            raise Exception("Invalid blockchain signature")
+            
+        data = recv_exact(self.socket, size)
+        if len(data) < size:
+            return None
         
-        # Send header size, header, then raw data
-        self.socket.sendall(struct.pack('!I', header_size))
-        self.socket.sendall(header_json)
-        self.socket.sendall(data)
+        # The signed digest authenticates the payload with a single hash pass
+        if hashlib.sha256(data).digest() != digest:
+            raise Exception("Image data does not match signed digest")
+        return data
     
     def receive(self):
         """Receive text data with blockchain verification"""
         if not self.blockchain_client.enabled:
-            # First read the 4-byte size
-            size_data = self.socket.recv(4)
-            if not size_data or len(size_data) < 4:
+            frame = read_framed(self.socket)
+            if frame is None:
                 return None
                 
-            size = struct.unpack('!I', size_data)[0]
-            
-            # Then read the payload
-            data = bytearray()
-            remaining = size
-            
-            while remaining > 0:
-                chunk = self.socket.recv(min(remaining, 4096))
-                if not chunk:
-                    break
-                data.extend(chunk)
-                remaining -= len(chunk)
-                
-            return data.decode()
+            return str(frame, 'utf-8')
             
         wrapped_message = self._receive_json()
         
@@ -205,35 +318,22 @@ class SecureSocket:
         ):
             raise Exception("Invalid blockchain signature")
             
-        return json.dumps(wrapped_message['message']['data'])
+        return orjson.dumps(wrapped_message['message']['data']).decode()
     
     def _send_json(self, data):
         """Send JSON data with size prefix"""
-        serialized = json.dumps(data).encode()
+        serialized = orjson.dumps(data)
         size = len(serialized)
-        self.socket.sendall(struct.pack('!I', size))
-        self.socket.sendall(serialized)
+        sendmsg_all(self.socket, [struct.pack('!I', size), serialized])
     
     def _receive_json(self):
         """Receive JSON data with size prefix"""
         try:
-            size_data = self.socket.recv(4)
-            if not size_data or len(size_data) < 4:
+            frame = read_framed(self.socket)
+            if frame is None:
                 return None
                 
-            size = struct.unpack('!I', size_data)[0]
-            
-            data = bytearray()
-            remaining = size
-            
-            while remaining > 0:
-                chunk = self.socket.recv(min(remaining, 4096))
-                if not chunk:
-                    return None
-                data.extend(chunk)
-                remaining -= len(chunk)
-                
-            return json.loads(data.decode())
+            return orjson.loads(frame)
             
         except Exception as e:
             print(f"Error receiving JSON: {str(e)}")
@@ -246,8 +346,21 @@ class BlockchainClient:
         self.service_id = service_id
         self.account = Account.from_key(private_key)
         self.blockchain_url = blockchain_url
-        self.web3 = Web3()
         self.enabled = True
+        
+        # Keep-alive connection pool for calls to the blockchain service and
+        # peer services; dropped connections are re-established transparently
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(
+            pool_connections=8,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.2)
+        ))
+        
+        # Recently rejected (message hash, signature) pairs mapped to the
+        # monotonic time their rejection expires, oldest first
+        self._rejected = OrderedDict()
+        self._rejected_lock = threading.Lock()
         print(f"Initialized blockchain client for {service_id} with public key {self.account.address}")
 
     def register(self):
@@ -256,9 +369,8 @@ class BlockchainClient:
             return True
 
         try:
-            import requests
             print(f"Registering with blockchain service at {self.blockchain_url}...")
-            response = requests.post(
+            response = self.session.post(
                 f"{self.blockchain_url}/register",
                 json={
                     'service_id': self.service_id,
@@ -277,15 +389,35 @@ class BlockchainClient:
 
     def sign_message(self, message_data):
         """Sign a message with service's private key"""
-        message_hash = self.web3.keccak(text=json.dumps(message_data, sort_keys=True))
-        signed_message = self.account.sign_message(message_hash)
-        return signed_message.signature.hex()
+        return self.sign_bytes(orjson.dumps(message_data, option=orjson.OPT_SORT_KEYS))
+
+    def sign_bytes(self, payload):
+        """Sign already-canonical message bytes with service's private key"""
+        # base64 carries the 65-byte signature in 88 chars instead of 132 hex
+        return base64.b64encode(self.sign_raw(payload)).decode()
+
+    def sign_raw(self, payload):
+        """Sign message bytes and return the raw 65-byte signature"""
+        # Not cached: every payload embeds its sender and timestamp, so a
+        # repeated payload is a replay the verifier will refuse anyway
+        message_hash = keccak(payload)
+        signed_message = self.account.sign_message(encode_defunct(primitive=message_hash))
+        return bytes(signed_message.signature)
 
     def verify_signature(self, message_data, signature):
         """Verify a message signature"""
         try:
-            import requests
-            response = requests.post(
+            # Only rejections are cached; an accept must still pass the
+            # blockchain service's replay check every time
+            key = (keccak(orjson.dumps(message_data, option=orjson.OPT_SORT_KEYS)), signature)
+            with self._rejected_lock:
+                expires = self._rejected.get(key)
+                if expires is not None:
+                    if time.monotonic() < expires:
+                        return False
+                    del self._rejected[key]
+            
+            response = self.session.post(
                 f"{self.blockchain_url}/verify",
                 json={
                     'message': message_data,
@@ -293,11 +425,40 @@ class BlockchainClient:
                     'sender_id': message_data.get('sender_id')
                 }
             )
-            return response.status_code == 200 and response.json().get('is_valid')
+            if response.status_code != 200:
+                return False
+            
+            is_valid = response.json().get('is_valid')
+            if not is_valid:
+                with self._rejected_lock:
+                    self._rejected[key] = time.monotonic() + REJECTED_CACHE_TTL
+                    if len(self._rejected) > REJECTED_CACHE_SIZE:
+                        self._rejected.popitem(last=False)
+            return is_valid
         except Exception as e:
             print(f"Error verifying signature: {str(e)}")
             return False
 
+# Column order of each metrics CSV
+METRIC_COLUMNS = {
+    'delay': [
+        'timestamp', 'source_service', 'destination_service',
+        'packet_id', 'packet_size', 'delay_ms', 'blockchain_enabled'
+    ],
+    'memory': [
+        'timestamp', 'service_name', 'memory_usage_mb',
+        'blockchain_enabled', 'total_memory_mb', 'memory_percent'
+    ],
+    'cpu': [
+        'timestamp', 'service_name', 'cpu_percent',
+        'blockchain_enabled', 'core_count', 'cpu_freq_mhz'
+    ],
+    'frames': [
+        'timestamp', 'request_id', 'image_number', 'capture_ms', 'encode_ms',
+        'send_ms', 'total_bytes', 'memory_mb', 'cpu_percent', 'blockchain_enabled'
+    ]
+}
+
 # Metrics manager for the camera service
 class BlockchainMetricsManager:
     def __init__(self, base_path="/app/metrics"):
@@ -307,154 +468,168 @@ class BlockchainMetricsManager:
         os.makedirs(os.path.join(self.base_path, 'delay', 'summaries'), exist_ok=True)
         os.makedirs(os.path.join(self.base_path, 'memory', 'summaries'), exist_ok=True)
         os.makedirs(os.path.join(self.base_path, 'cpu', 'summaries'), exist_ok=True)
+        os.makedirs(os.path.join(self.base_path, 'frames'), exist_ok=True)
         os.makedirs(os.path.join(self.base_path, 'comparisons'), exist_ok=True)
         
         # Create locks for file access
         self.file_locks = {
             'delay': threading.Lock(),
             'memory': threading.Lock(),
-            'cpu': threading.Lock()
+            'cpu': threading.Lock(),
+            'frames': threading.Lock()
         }
         
-        # Initialize files if they don't exist
-        self._initialize_dataframes()
+        # Rows are buffered per metric and appended to CSV in batches
+        self._buffers = {'delay': [], 'memory': [], 'cpu': [], 'frames': []}
+        self._flush_threshold = 64
+        self._flush_interval = 5  # seconds
+        
+        # Process handle and host values that stay fixed for the container
+        self._process = psutil.Process()
+        self._process.cpu_percent(interval=None)  # prime the non-blocking sampler
+        self._core_count = psutil.cpu_count()
+        self._total_memory_mb = psutil.virtual_memory().total / 1024 / 1024
+        self._cpu_freq_mhz = 0
+        self._cpu_freq_checked = 0
+        
+        # Flush periodically and on shutdown
+        atexit.register(self._flush_all)
+        flush_thread = threading.Thread(target=self._flush_loop)
+        flush_thread.daemon = True
+        flush_thread.start()
         
         print("Initialized BlockchainMetricsManager")
 
-    def _initialize_dataframes(self):
-        """Initialize metrics files with headers if they don't exist"""
+    def record_delay(self, source_service, destination_service, packet_id, 
+                    packet_size, delay_ms, blockchain_enabled, ts=None):
+        """Record packet delay metrics"""
         try:
-            import pandas as pd
-            
-            files_and_headers = {
-                'delay/raw_data.csv': [
-                    'timestamp', 'source_service', 'destination_service',
-                    'packet_id', 'packet_size', 'delay_ms', 'blockchain_enabled'
-                ],
-                'memory/raw_data.csv': [
-                    'timestamp', 'service_name', 'memory_usage_mb',
-                    'blockchain_enabled', 'total_memory_mb', 'memory_percent'
-                ],
-                'cpu/raw_data.csv': [
-                    'timestamp', 'service_name', 'cpu_percent',
-                    'blockchain_enabled', 'core_count', 'cpu_freq_mhz'
-                ]
-            }
+            new_row = [
+                ts or datetime.now().isoformat(),
+                source_service,
+                destination_service,
+                packet_id,
+                packet_size,
+                delay_ms,
+                blockchain_enabled
+            ]
+            self._buffer_row('delay', new_row)
             
-            for file_path, headers in files_and_headers.items():
-                full_path = os.path.join(self.base_path, file_path)
-                if not os.path.exists(full_path):
-                    df = pd.DataFrame(columns=headers)
-                    df.to_csv(full_path, index=False)
-                    print(f"Created metrics file: {full_path}")
-                    
         except Exception as e:
-            print(f"Error initializing metrics files: {str(e)}")
+            print(f"Error recording delay metrics: {str(e)}")
 
-    def record_delay(self, source_service, destination_service, packet_id, 
-                    packet_size, delay_ms, blockchain_enabled):
-        """Record packet delay metrics"""
-        with self.file_locks['delay']:
-            try:
-                import pandas as pd
-                file_path = os.path.join(self.base_path, 'delay', 'raw_data.csv')
-                
-                # Read existing data or create new DataFrame
-                try:
-                    df = pd.read_csv(file_path)
-                except:
-                    df = pd.DataFrame(columns=[
-                        'timestamp', 'source_service', 'destination_service',
-                        'packet_id', 'packet_size', 'delay_ms', 'blockchain_enabled'
-                    ])
-                
-                # Add new row
-                new_row = {
-                    'timestamp': datetime.now().isoformat(),
-                    'source_service': source_service,
-                    'destination_service': destination_service,
-                    'packet_id': packet_id,
-                    'packet_size': packet_size,
-                    'delay_ms': delay_ms,
-                    'blockchain_enabled': blockchain_enabled
-                }
-                
-                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                df.to_csv(file_path, index=False)
-                
-            except Exception as e:
-                print(f"Error recording delay metrics: {str(e)}")
-
-    def record_memory_usage(self, service_name, blockchain_enabled):
+    def record_memory_usage(self, service_name, blockchain_enabled, ts=None):
         """Record memory usage metrics"""
-        with self.file_locks['memory']:
-            try:
-                import pandas as pd
-                import psutil
-                
-                file_path = os.path.join(self.base_path, 'memory', 'raw_data.csv')
-                
-                # Read existing data or create new DataFrame
-                try:
-                    df = pd.read_csv(file_path)
-                except:
-                    df = pd.DataFrame(columns=[
-                        'timestamp', 'service_name', 'memory_usage_mb',
-                        'blockchain_enabled', 'total_memory_mb', 'memory_percent'
-                    ])
-                
-                process = psutil.Process()
-                memory_info = process.memory_info()
-                
-                new_row = {
-                    'timestamp': datetime.now().isoformat(),
-                    'service_name': service_name,
-                    'memory_usage_mb': memory_info.rss / 1024 / 1024,
-                    'blockchain_enabled': blockchain_enabled,
-                    'total_memory_mb': psutil.virtual_memory().total / 1024 / 1024,
-                    'memory_percent': process.memory_percent()
-                }
-                
-                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                df.to_csv(file_path, index=False)
-                
-            except Exception as e:
-                print(f"Error recording memory metrics: {str(e)}")
+        try:
+            process = self._process
+            memory_info = process.memory_info()
+            
+            new_row = [
+                ts or datetime.now().isoformat(),
+                service_name,
+                memory_info.rss / 1024 / 1024,
+                blockchain_enabled,
+                self._total_memory_mb,
+                memory_info.rss / 1024 / 1024 / self._total_memory_mb * 100
+            ]
+            self._buffer_row('memory', new_row)
+            
+        except Exception as e:
+            print(f"Error recording memory metrics: {str(e)}")
 
-    def record_cpu_usage(self, service_name, blockchain_enabled):
+    def record_cpu_usage(self, service_name, blockchain_enabled, ts=None):
         """Record CPU usage metrics"""
-        with self.file_locks['cpu']:
-            try:
-                import pandas as pd
-                import psutil
-                
-                file_path = os.path.join(self.base_path, 'cpu', 'raw_data.csv')
-                
-                # Read existing data or create new DataFrame
-                try:
-                    df = pd.read_csv(file_path)
-                except:
-                    df = pd.DataFrame(columns=[
-                        'timestamp', 'service_name', 'cpu_percent',
-                        'blockchain_enabled', 'core_count', 'cpu_freq_mhz'
-                    ])
-                
-                process = psutil.Process()
-                
-                new_row = {
-                    'timestamp': datetime.now().isoformat(),
-                    'service_name': service_name,
-                    'cpu_percent': process.cpu_percent(interval=0.1),
-                    'blockchain_enabled': blockchain_enabled,
-                    'core_count': psutil.cpu_count(),
-                    'cpu_freq_mhz': psutil.cpu_freq().current if psutil.cpu_freq() else 0
-                }
+        try:
+            process = self._process
+            
+            new_row = [
+                ts or datetime.now().isoformat(),
+                service_name,
+                process.cpu_percent(interval=None),
+                blockchain_enabled,
+                self._core_count,
+                self._get_cpu_freq()
+            ]
+            self._buffer_row('cpu', new_row)
+            
+        except Exception as e:
+            print(f"Error recording CPU metrics: {str(e)}")
+
+    def record_frame(self, request_id, image_number, capture_ms, encode_ms,
+                     send_ms, total_bytes, blockchain_enabled, ts=None):
+        """Record one composite row of per-frame timings and resource usage"""
+        try:
+            # as_dict samples everything under one psutil oneshot() pass
+            info = self._process.as_dict(attrs=['memory_info', 'cpu_percent'])
+            
+            new_row = [
+                ts or datetime.now().isoformat(),
+                request_id,
+                image_number,
+                capture_ms,
+                encode_ms,
+                send_ms,
+                total_bytes,
+                info['memory_info'].rss / 1024 / 1024,
+                info['cpu_percent'],
+                blockchain_enabled
+            ]
+            self._buffer_row('frames', new_row)
+            
+        except Exception as e:
+            print(f"Error recording frame metrics: {str(e)}")
+
+    def _get_cpu_freq(self):
+        """Current CPU frequency in MHz, re-read at most every 10 seconds"""
+        now = time.monotonic()
+        if now - self._cpu_freq_checked >= 10:
+            cpu_freq = psutil.cpu_freq()
+            self._cpu_freq_mhz = cpu_freq.current if cpu_freq else 0
+            self._cpu_freq_checked = now
+        return self._cpu_freq_mhz
+
+    def _buffer_row(self, kind, row):
+        """Queue a metrics row, flushing once the buffer is full"""
+        with self.file_locks[kind]:
+            self._buffers[kind].append(row)
+            if len(self._buffers[kind]) >= self._flush_threshold:
+                self._flush(kind)
+
+    def _flush(self, kind):
+        """Append buffered rows to the metric's daily CSV (caller holds its lock)"""
+        rows = self._buffers[kind]
+        if not rows:
+            return
+            
+        try:
+            # One file per day keeps every raw file bounded; rows are in
+            # time order, so each day is one contiguous run
+            for day, day_rows in groupby(rows, key=lambda row: row[0][:10]):
+                file_path = os.path.join(self.base_path, kind, f'raw_data-{day}.csv')
+                write_header = not os.path.exists(file_path)
                 
-                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                df.to_csv(file_path, index=False)
+                with open(file_path, 'a', newline='') as f:
+                    writer = csv.writer(f)
+                    if write_header:
+                        writer.writerow(METRIC_COLUMNS[kind])
+                    writer.writerows(day_rows)
                 
-            except Exception as e:
-                print(f"Error recording CPU metrics: {str(e)}")
+            rows.clear()
+            
+        except Exception as e:
+            print(f"Error flushing {kind} metrics: {str(e)}")
+
+    def _flush_all(self):
+        """Flush every metric buffer"""
+        for kind in self._buffers:
+            with self.file_locks[kind]:
+                self._flush(kind)
+
+    def _flush_loop(self):
+        """Periodically flush buffered metrics"""
+        while True:
+            time.sleep(self._flush_interval)
+            self._flush_all()
 
 # Main Camera Service class
 class CameraService:
@@ -490,37 +665,43 @@ class CameraService:
         # Initialize metrics manager
         self.metrics_manager = BlockchainMetricsManager()
         
-        # Camera state
+        # Camera state; the device stays open for the service lifetime
         self.camera = None
         self.stop_capture = False
+        self._camera_lock = threading.Lock()
+        # Forward the camera's own MJPEG frames instead of decoding and re-encoding
+        self.mjpeg_passthrough = os.getenv('MJPEG_PASSTHROUGH', 'false').lower() == 'true'
+        
+        # Bounded worker pool for client handling; one admission slot per
+        # worker so an accepted client never waits behind the pool's queue
+        handler_workers = (os.cpu_count() or 1) * 4
+        self._pool = ThreadPoolExecutor(max_workers=handler_workers)
+        self._client_slots = threading.BoundedSemaphore(
+            int(os.getenv('MAX_PENDING_CLIENTS', str(handler_workers)))
+        )
+        # Capture sessions share the one camera, so they get their own
+        # single worker and never tie up handler threads waiting for it;
+        # admission slots cover running and queued sessions, each of which
+        # holds its client socket open
+        self._capture_pool = ThreadPoolExecutor(max_workers=1)
+        self._capture_slots = threading.BoundedSemaphore(
+            int(os.getenv('MAX_QUEUED_CAPTURES', '2'))
+        )
         
         print(f"Configuration loaded:")
         print(f"RPI ZeroTier IP: {self.rpi_zerotier_ip}")
         print(f"Windows ZeroTier IP: {self.windows_zerotier_ip}")
         print(f"Listening on: {self.host}:{self.port}")
         print(f"Blockchain Enabled: {self.blockchain_enabled}")
+        print(f"MJPEG Passthrough: {self.mjpeg_passthrough}")
         sys.stdout.flush()
         
-        # Check camera availability
-        if not self._check_camera_device():
+        # Open the camera once up front
+        if not self.init_camera():
             print("WARNING: Camera device not found or not accessible")
         else:
             print("Camera device is available")
 
-    def _check_camera_device(self):
-        """Check if camera device is available"""
-        try:
-            # Try to open camera briefly
-            cap = cv2.VideoCapture(0, cv2.CAP_V4L2)
-            if cap.isOpened():
-                ret, _ = cap.read()
-                cap.release()
-                return ret
-            return False
-        except Exception as e:
-            print(f"Error checking camera: {str(e)}")
-            return False
-
     def init_camera(self):
         """Initialize the camera device with performance metrics"""
         try:
@@ -540,6 +721,11 @@ class CameraService:
             self.camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
             self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
             self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+            # Keep the driver queue short so reads between requests stay fresh
+            self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            if self.mjpeg_passthrough:
+                # read() then returns the compressed JPEG bytes as they left the camera
+                self.camera.set(cv2.CAP_PROP_CONVERT_RGB, 0)
             
             # Test capture
             ret, _ = self.camera.read()
@@ -569,13 +755,27 @@ class CameraService:
                 self.camera = None
             return False
 
+    def release_camera(self):
+        """Release the camera device on service shutdown"""
+        self.stop_capture = True
+        with self._camera_lock:
+            if self.camera:
+                self.camera.release()
+            self.camera = None
+
     def capture_and_send(self, client_socket, request_id, requester_email):
+        """Capture and send images, one request at a time on the shared camera"""
+        with self._camera_lock:
+            self._capture_and_send(client_socket, request_id, requester_email)
+
+    def _capture_and_send(self, client_socket, request_id, requester_email):
         """Capture and send images with blockchain security and metrics"""
         start_time = time.time()
         image_count = 0
         
         try:
-            if not self.init_camera():
+            # Reopen only if the device was unavailable or has been lost
+            if self.camera is None and not self.init_camera():
                 print("Failed to initialize camera")
                 return
             
@@ -595,117 +795,87 @@ class CameraService:
             }
             
             msg_start = time.time()
-            socket.send(json.dumps(start_message))
+            start_size = socket.send(start_message)
             
             # Record start message metrics
             self.metrics_manager.record_delay(
                 source_service='camera',
                 destination_service='image-db',
                 packet_id=f"start-{request_id}",
-                packet_size=len(json.dumps(start_message)),
+                packet_size=start_size,
                 delay_ms=(time.time() - msg_start) * 1000,
                 blockchain_enabled=self.blockchain_enabled
             )
             
             print(f"Starting image capture for request {request_id} (email: {requester_email})")
             
-            # Main capture loop - 2 minutes of capture time
-            while time.time() - start_time < 120 and not self.stop_capture:
-                try:
-                    # Capture frame with metrics
-                    capture_start = time.time()
-                    ret, frame = self.camera.read()
-                    
-                    if not ret:
-                        print("Failed to capture frame, retrying...")
-                        time.sleep(1)
-                        continue
-                    
-                    # Record capture metrics
-                    self.metrics_manager.record_delay(
-                        source_service='camera',
-                        destination_service='camera',
-                        packet_id=f"capture-{request_id}-{image_count}",
-                        packet_size=frame.nbytes,
-                        delay_ms=(time.time() - capture_start) * 1000,
-                        blockchain_enabled=self.blockchain_enabled
-                    )
-                    
-                    # Process image - add timestamp overlay
-                    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    cv2.putText(frame, timestamp, (10, 30), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                    
-                    # Encode image
-                    encode_start = time.time()
-                    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 70]
-                    _, buffer = cv2.imencode('.jpg', frame, encode_param)
-                    image_data = buffer.tobytes()
-                    
-                    # Record encoding metrics
-                    self.metrics_manager.record_delay(
-                        source_service='camera',
-                        destination_service='camera',
-                        packet_id=f"encode-{request_id}-{image_count}",
-                        packet_size=len(image_data),
-                        delay_ms=(time.time() - encode_start) * 1000,
-                        blockchain_enabled=self.blockchain_enabled
-                    )
-                    
-                    # Send image metadata
-                    send_start = time.time()
-                    metadata = {
-                        'type': 'image',
-                        'request_id': request_id,
-                        'image_number': image_count + 1,
-                        'timestamp': timestamp,
-                        'size': len(image_data),
-                        'requester_email': requester_email
-                    }
-                    
-                    socket.send(json.dumps(metadata))
-                    
-                    # Send actual image data
-                    socket.send_raw(image_data)
-                    
-                    # Record sending metrics
-                    self.metrics_manager.record_delay(
-                        source_service='camera',
-                        destination_service='image-db',
-                        packet_id=f"send-{request_id}-{image_count}",
-                        packet_size=len(image_data),
-                        delay_ms=(time.time() - send_start) * 1000,
-                        blockchain_enabled=self.blockchain_enabled
-                    )
-                    
-                    image_count += 1
-                    print(f"Successfully sent image {image_count}")
-                    
-                    # Record memory and CPU metrics
-                    self.metrics_manager.record_memory_usage(
-                        service_name='camera',
-                        blockchain_enabled=self.blockchain_enabled
-                    )
-                    self.metrics_manager.record_cpu_usage(
-                        service_name='camera',
-                        blockchain_enabled=self.blockchain_enabled
-                    )
-                    
-                    # Wait between captures to reduce load and bandwidth
-                    time.sleep(10)
-                    
-                except Exception as e:
-                    print(f"Error in capture loop: {str(e)}")
-                    break
+            # Pipeline: this thread captures, one worker annotates and
+            # encodes, another sends, so a slow stage never blocks capture
+            encode_queue = Queue(maxsize=2)
+            send_queue = Queue(maxsize=2)
+            stop_event = threading.Event()
+            progress = {'sent': 0}
+            stages = [
+                threading.Thread(
+                    target=self._encode_frames,
+                    args=(encode_queue, send_queue, request_id, stop_event)
+                ),
+                threading.Thread(
+                    target=self._send_frames,
+                    args=(send_queue, socket, request_id, requester_email, progress, stop_event)
+                )
+            ]
+            for stage in stages:
+                stage.daemon = True
+                stage.start()
+            
+            frame_number = 0
+            try:
+                # Main capture loop - 2 minutes of capture time
+                while (time.time() - start_time < 120 and not self.stop_capture
+                       and not stop_event.is_set()):
+                    try:
+                        # Capture frame with metrics
+                        capture_start = time.time()
+                        ret, frame = self.camera.read()
+                        
+                        if not ret:
+                            print("Failed to capture frame, retrying...")
+                            time.sleep(1)
+                            continue
+                        
+                        # Timings travel with the frame into one metrics row
+                        capture_ms = (time.time() - capture_start) * 1000
+                        
+                        # One clock read per frame feeds both the overlay and the metrics row
+                        now = datetime.now()
+                        timestamp = now.strftime('%Y-%m-%d %H:%M:%S')
+                        encode_queue.put((frame, timestamp, now.isoformat(), capture_ms))
+                        frame_number += 1
+                        
+                        # Wait between captures to reduce load and bandwidth
+                        stop_event.wait(10)
+                        
+                    except Exception as e:
+                        print(f"Error in capture loop: {str(e)}")
+                        break
+            finally:
+                # Drain the pipeline before the end message goes out
+                encode_queue.put(None)
+                for stage in stages:
+                    stage.join()
+                image_count = progress['sent']
             
         except Exception as e:
             print(f"Error in capture_and_send: {str(e)}")
         finally:
-            if self.camera:
-                self.camera.release()
-            self.camera = None
             self.stop_capture = False
             
+            # Drop a device that went away so the next request reopens it
+            if self.camera is not None and not self.camera.isOpened():
+                self.camera.release()
+                self.camera = None
+            
             # Send end message with metrics
             try:
                 end_message = {
@@ -716,14 +886,14 @@ class CameraService:
                 }
                 
                 end_start = time.time()
-                socket.send(json.dumps(end_message))
+                end_size = socket.send(end_message)
                 
                 # Record end message metrics
                 self.metrics_manager.record_delay(
                     source_service='camera',
                     destination_service='image-db',
                     packet_id=f"end-{request_id}",
-                    packet_size=len(json.dumps(end_message)),
+                    packet_size=end_size,
                     delay_ms=(time.time() - end_start) * 1000,
                     blockchain_enabled=self.blockchain_enabled
                 )
@@ -733,6 +903,89 @@ class CameraService:
             except Exception as e:
                 print(f"Error sending end message: {str(e)}")
 
+    def _encode_frames(self, encode_queue, send_queue, request_id, stop_event):
+        """Pipeline stage: add the timestamp overlay and JPEG-encode frames"""
+        try:
+            while True:
+                item = encode_queue.get()
+                if item is None:
+                    break
+                frame, timestamp, ts, capture_ms = item
+                
+                if self.mjpeg_passthrough:
+                    # Already JPEG; the timestamp travels in the image metadata instead
+                    send_queue.put((memoryview(frame.reshape(-1)), timestamp, ts, capture_ms, 0.0))
+                    continue
+                
+                # Process image - add timestamp overlay
+                cv2.putText(frame, timestamp, (10, 30), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                
+                # Encode image
+                encode_start = time.time()
+                encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 70]
+                _, buffer = cv2.imencode('.jpg', frame, encode_param)
+                # Flat view of the encoded buffer; sockets send it without a copy
+                image_data = memoryview(buffer).cast('B')
+                
+                encode_ms = (time.time() - encode_start) * 1000
+                
+                send_queue.put((image_data, timestamp, ts, capture_ms, encode_ms))
+                
+        except Exception as e:
+            print(f"Error encoding frames: {str(e)}")
+            stop_event.set()
+            # Keep consuming so the capture loop never blocks on a full queue
+            while encode_queue.get() is not None:
+                pass
+        finally:
+            send_queue.put(None)
+
+    def _send_frames(self, send_queue, socket, request_id, requester_email, progress, stop_event):
+        """Pipeline stage: send encoded frames with their metadata"""
+        try:
+            while True:
+                item = send_queue.get()
+                if item is None:
+                    break
+                image_data, timestamp, ts, capture_ms, encode_ms = item
+                
+                # Send image metadata
+                send_start = time.time()
+                metadata = {
+                    'type': 'image',
+                    'request_id': request_id,
+                    'image_number': progress['sent'] + 1,
+                    'timestamp': timestamp,
+                    'size': len(image_data),
+                    'requester_email': requester_email
+                }
+                
+                # Metadata and image data leave in a single sendmsg
+                socket.send_frames(metadata, image_data)
+                
+                progress['sent'] += 1
+                print(f"Successfully sent image {progress['sent']}")
+                
+                # One composite row per frame: stage timings plus resource usage
+                self.metrics_manager.record_frame(
+                    request_id=request_id,
+                    image_number=progress['sent'],
+                    capture_ms=capture_ms,
+                    encode_ms=encode_ms,
+                    send_ms=(time.time() - send_start) * 1000,
+                    total_bytes=len(image_data),
+                    blockchain_enabled=self.blockchain_enabled,
+                    ts=ts
+                )
+                
+        except Exception as e:
+            print(f"Error sending frames: {str(e)}")
+            stop_event.set()
+            # Keep consuming so the encode stage never blocks on a full queue
+            while send_queue.get() is not None:
+                pass
+
     def handle_client(self, client_socket, addr):
         """Handle client connection with blockchain security"""
         try:
@@ -751,22 +1004,25 @@ class CameraService:
                 print("Received empty command data")
                 return
             
-            command = json.loads(command_data)
+            command = orjson.loads(command_data)
             print(f"Received command: {command['command']} from {addr}")
             
             if command['command'] == 'start_capture':
                 request_id = command.get('request_id', str(int(time.time())))
                 requester_email = command.get('requester_email', 'unknown@example.com')
                 
-                # Start capture in a new thread
-                capture_thread = threading.Thread(
-                    target=self.capture_and_send,
-                    args=(client_socket, request_id, requester_email)
-                )
-                capture_thread.daemon = True
-                capture_thread.start()
+                # Shed capture requests instead of queueing them without bound
+                if not self._capture_slots.acquire(blocking=False):
+                    print(f"Rejecting capture from {addr}: too many queued captures")
+                    client_socket.close()
+                    return False
                 
-                # Don't close the socket - the capture thread will handle it
+                # Start capture on the capture worker; the slot is held
+                # until the session has finished with the camera
+                future = self._capture_pool.submit(self.capture_and_send, client_socket, request_id, requester_email)
+                future.add_done_callback(lambda _: self._capture_slots.release())
+                
+                # Don't close the socket - the capture worker will handle it
                 return True
             else:
                 print(f"Unknown command: {command['command']}")
@@ -792,13 +1048,21 @@ class CameraService:
                     client_socket, addr = server_socket.accept()
                     print(f"Accepted connection from {addr}")
                     
-                    # Handle client in a new thread
-                    client_thread = threading.Thread(
-                        target=self.handle_client,
-                        args=(client_socket, addr)
-                    )
-                    client_thread.daemon = True
-                    client_thread.start()
+                    # Send small metadata frames immediately and give JPEG
+                    # payloads room in the kernel buffers
+                    client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+                    client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+                    
+                    # Shed load instead of queueing without bound
+                    if not self._client_slots.acquire(blocking=False):
+                        print(f"Rejecting connection from {addr}: too many pending clients")
+                        client_socket.close()
+                        continue
+                    
+                    # Handle client on the worker pool
+                    future = self._pool.submit(self.handle_client, client_socket, addr)
+                    future.add_done_callback(lambda _: self._client_slots.release())
                     
                 except Exception as e:
                     print(f"Error accepting connection: {str(e)}")
@@ -812,6 +1076,13 @@ if __name__ == "__main__":
     # Initialize camera service
     camera_service = CameraService()
     
+    def handle_shutdown(signum, frame):
+        """Release the camera before the container stops"""
+        camera_service.release_camera()
+        sys.exit(0)
+    
+    signal.signal(signal.SIGTERM, handle_shutdown)
+    
     # Start server
     print("Starting Camera Service...")
     sys.stdout.flush()
@@ -1,21 +1,46 @@
 from flask import Flask, request, jsonify
-import imaplib
 import email
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.image import MIMEImage
 import time
+import hashlib
 import requests
+import orjson
 import os
-import json
+import re
 from datetime import datetime
 import threading
+from queue import Queue, Empty, Full
+from collections import OrderedDict
+from imapclient import IMAPClient, SEEN
 from blockchain_client import BlockchainClient
 from metrics_manager import BlockchainMetricsManager
 
 app = Flask(__name__)
 
+# Email command triggers, matched case-insensitively without lowercasing
+PICTURE_REQUEST_PATTERN = re.compile(r'send pictures for 2 minutes', re.IGNORECASE)
+STATUS_REQUEST_PATTERN = re.compile(r'give latest status', re.IGNORECASE)
+
+# Logged-in SMTP connections kept between messages
+SMTP_POOL_SIZE = 5
+SMTP_MAX_MESSAGES = 100  # recycle a connection after this many sends
+SMTP_IDLE_CHECK = 60  # seconds idle before a pooled connection is NOOP-checked
+SMTP_BREAKER_THRESHOLD = 5  # consecutive failed sends that open the circuit
+SMTP_BREAKER_RESET = 30  # seconds the circuit stays open before a trial send
+
+# Inbox monitoring waits in IMAP IDLE; the timeout re-checks as a safety net
+IMAP_IDLE_TIMEOUT = 5 * 60  # seconds
+METRICS_INTERVAL = 10  # seconds between memory/CPU samples
+
+# Identical notifications to the same recipient are sent at most once per window
+NOTIFICATION_DEDUP_TTL = 300  # seconds
+
+class SMTPUnavailable(Exception):
+    """Raised without contacting the server while the SMTP circuit is open"""
+
 class EmailHandlerService:
     def __init__(self):
         # Email configuration
@@ -24,6 +49,15 @@ class EmailHandlerService:
         self.imap_server = "imap.gmail.com"
         self.smtp_server = "smtp.gmail.com"
         self.smtp_port = 465
+        self._smtp_pool = Queue(maxsize=SMTP_POOL_SIZE)
+        self._smtp_failures = 0
+        self._smtp_open_until = 0
+        self._smtp_trial = False  # a half-open trial send is in flight
+        self._smtp_breaker_lock = threading.Lock()
+        
+        # Recently sent notifications, oldest first, to suppress duplicates
+        self._recent_notifications = OrderedDict()
+        self._notifications_lock = threading.Lock()
         
         # Initialize metrics manager
         self.metrics_manager = BlockchainMetricsManager()
@@ -51,33 +85,34 @@ class EmailHandlerService:
         print(f"Blockchain Enabled: {self.blockchain_enabled}")
 
     def start_monitoring(self):
-        """Start email monitoring in a separate thread."""
+        """Start email monitoring and metrics sampling in separate threads."""
         monitor_thread = threading.Thread(target=self.run)
         monitor_thread.daemon = True
         monitor_thread.start()
+        
+        metrics_thread = threading.Thread(target=self._sample_metrics)
+        metrics_thread.daemon = True
+        metrics_thread.start()
 
-    def check_emails(self):
-        """Check for new emails requesting pictures."""
+    def check_emails(self, mail):
+        """Process unread emails requesting pictures."""
         try:
             start_time = time.time()
             
-            mail = imaplib.IMAP4_SSL(self.imap_server)
-            mail.login(self.email_address, self.email_password)
-            mail.select('inbox')
-            
             # Search for unread emails
-            _, messages = mail.search(None, 'UNSEEN')
+            messages = mail.search('UNSEEN')
+            if not messages:
+                return
             
-            for num in messages[0].split():
-                _, msg = mail.fetch(num, '(RFC822)')
-                email_body = msg[0][1]
+            for num, msg in mail.fetch(messages, ['RFC822']).items():
+                email_body = msg[b'RFC822']
                 email_message = email.message_from_bytes(email_body)
                 
                 # Record email check metrics
                 self.metrics_manager.record_delay(
                     source_service='email-handler',
                     destination_service='email-server',
-                    packet_id=f"check-{num.decode()}",
+                    packet_id=f"check-{num}",
                     packet_size=len(email_body),
                     delay_ms=(time.time() - start_time) * 1000,
                     blockchain_enabled=self.blockchain_enabled
@@ -99,15 +134,13 @@ class EmailHandlerService:
                 print(f"Subject: {subject}")
                 
                 # Process commands
-                if 'send pictures for 2 minutes' in body.lower():
+                if PICTURE_REQUEST_PATTERN.search(body):
                     self._handle_picture_request(sender)
-                elif 'give latest status' in subject.lower():
+                elif STATUS_REQUEST_PATTERN.search(subject):
                     self._handle_status_request(sender)
                 
                 # Mark as read
-                mail.store(num, '+FLAGS', '\\Seen')
-            
-            mail.logout()
+                mail.add_flags(num, [SEEN])
             
         except Exception as e:
             print(f"Error checking emails: {str(e)}")
@@ -125,12 +158,15 @@ class EmailHandlerService:
                 else:
                     response = requests.get(url, params=data)
             
+            # Measure the body exactly as it was serialized for the wire
+            body = response.request.body if response is not None else None
+            
             # Record metrics
             self.metrics_manager.record_delay(
                 source_service='email-handler',
                 destination_service='image-db',
                 packet_id=f"{int(start_time)}",
-                packet_size=len(json.dumps(data)) if data else 0,
+                packet_size=len(body) if body else 0,
                 delay_ms=(time.time() - start_time) * 1000,
                 blockchain_enabled=self.blockchain_enabled
             )
@@ -189,6 +225,11 @@ class EmailHandlerService:
 
     def _send_confirmation_email(self, recipient, subject, message):
         """Send confirmation email with metrics"""
+        notification = (recipient, subject, message)
+        if not self._claim_notification(notification):
+            print(f"Skipping duplicate notification to {recipient}")
+            return
+        
         try:
             start_time = time.time()
             
@@ -198,9 +239,7 @@ class EmailHandlerService:
             msg['Subject'] = subject
             msg.attach(MIMEText(message, 'plain'))
             
-            with smtplib.SMTP_SSL(self.smtp_server, self.smtp_port) as server:
-                server.login(self.email_address, self.email_password)
-                server.send_message(msg)
+            self.send_email(msg)
             
             # Record email sending metrics
             self.metrics_manager.record_delay(
@@ -214,6 +253,108 @@ class EmailHandlerService:
             
         except Exception as e:
             print(f"Error sending confirmation: {str(e)}")
+            # Let a later attempt through since this one never arrived
+            with self._notifications_lock:
+                self._recent_notifications.pop(notification, None)
+
+    def _claim_notification(self, notification):
+        """Reserve a notification, returning False if it was sent recently"""
+        now = time.monotonic()
+        with self._notifications_lock:
+            recent = self._recent_notifications
+            while recent and next(iter(recent.values())) <= now - NOTIFICATION_DEDUP_TTL:
+                recent.popitem(last=False)
+            
+            if notification in recent:
+                return False
+            recent[notification] = now
+            return True
+
+    def send_email(self, msg):
+        """Send a message, failing fast while the SMTP server is known to be down"""
+        with self._smtp_breaker_lock:
+            # At or above the threshold the circuit is open until the reset
+            # window ends, then half-open: exactly one trial send goes out
+            trial = self._smtp_failures >= SMTP_BREAKER_THRESHOLD
+            if trial:
+                if time.monotonic() < self._smtp_open_until or self._smtp_trial:
+                    raise SMTPUnavailable("SMTP server unavailable, retry later")
+                self._smtp_trial = True
+        
+        try:
+            self._send_pooled(msg)
+        except Exception:
+            with self._smtp_breaker_lock:
+                self._smtp_failures += 1
+                # Stays at or above the threshold until a send succeeds, so a
+                # failed trial send reopens the circuit immediately
+                if self._smtp_failures >= SMTP_BREAKER_THRESHOLD:
+                    self._smtp_open_until = time.monotonic() + SMTP_BREAKER_RESET
+                if trial:
+                    self._smtp_trial = False
+            raise
+        
+        with self._smtp_breaker_lock:
+            self._smtp_failures = 0
+            if trial:
+                self._smtp_trial = False
+
+    def _send_pooled(self, msg):
+        """Send a message over a pooled, already logged-in SMTP connection"""
+        smtp, sent = self._checkout_smtp()
+        try:
+            try:
+                smtp.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # The server dropped the pooled connection; retry once on a fresh one
+                self._close_smtp(smtp)
+                smtp, sent = self._connect_smtp(), 0
+                smtp.send_message(msg)
+        except Exception:
+            self._close_smtp(smtp)
+            raise
+        self._checkin_smtp(smtp, sent + 1)
+
+    def _connect_smtp(self):
+        """Open and authenticate a new SMTP connection"""
+        smtp = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, timeout=30)
+        smtp.login(self.email_address, self.email_password)
+        return smtp
+
+    def _checkout_smtp(self):
+        """Take a live connection from the pool, or open one if none is idle"""
+        try:
+            smtp, sent, last_used = self._smtp_pool.get_nowait()
+        except Empty:
+            return self._connect_smtp(), 0
+        
+        if time.monotonic() - last_used > SMTP_IDLE_CHECK:
+            try:
+                if smtp.noop()[0] == 250:
+                    return smtp, sent
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close_smtp(smtp)
+            return self._connect_smtp(), 0
+        
+        return smtp, sent
+
+    def _checkin_smtp(self, smtp, sent):
+        """Return a connection to the pool unless it is due for recycling"""
+        if sent >= SMTP_MAX_MESSAGES:
+            self._close_smtp(smtp)
+            return
+        try:
+            self._smtp_pool.put_nowait((smtp, sent, time.monotonic()))
+        except Full:
+            self._close_smtp(smtp)
+
+    def _close_smtp(self, smtp):
+        """Close an SMTP connection, ignoring errors from a dead server"""
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
 
     def _send_error_email(self, recipient, error_message):
         """Send error notification email"""
@@ -224,13 +365,31 @@ class EmailHandlerService:
         )
 
     def run(self):
-        """Main service loop with metrics collection"""
+        """Main service loop: wait in IMAP IDLE and process mail as it arrives"""
         print("Starting email monitoring loop...")
         while True:
             try:
-                self.check_emails()
-                
-                # Record memory and CPU metrics
+                with IMAPClient(self.imap_server, ssl=True) as mail:
+                    mail.login(self.email_address, self.email_password)
+                    mail.select_folder('INBOX')
+                    
+                    while True:
+                        self.check_emails(mail)
+                        
+                        # Block until the server pushes a mailbox change
+                        mail.idle()
+                        try:
+                            mail.idle_check(timeout=IMAP_IDLE_TIMEOUT)
+                        finally:
+                            mail.idle_done()
+            except Exception as e:
+                print(f"Error in main loop: {str(e)}")
+                time.sleep(30)
+
+    def _sample_metrics(self):
+        """Record memory and CPU metrics on a fixed tick, independent of mail"""
+        while True:
+            try:
                 self.metrics_manager.record_memory_usage(
                     service_name='email-handler',
                     blockchain_enabled=self.blockchain_enabled
@@ -239,11 +398,9 @@ class EmailHandlerService:
                     service_name='email-handler',
                     blockchain_enabled=self.blockchain_enabled
                 )
-                
-                time.sleep(10)
             except Exception as e:
-                print(f"Error in main loop: {str(e)}")
-                time.sleep(30)
+                print(f"Error sampling metrics: {str(e)}")
+            time.sleep(METRICS_INTERVAL)
 
 # Flask routes
 @app.route('/send_image', methods=['POST'])
@@ -252,27 +409,52 @@ def send_image():
     try:
         start_time = time.time()
         
+        # Cheap form checks first, so malformed requests never cost a verify call
+        if 'image' not in request.files:
+            return jsonify({'status': 'error', 'message': 'No image file'}), 400
+            
+        image_file = request.files['image']
+        requester_email = request.form.get('requester_email')
+        request_id = request.form.get('request_id')
+        
+        if not requester_email:
+            return jsonify({'status': 'error', 'message': 'No requester email'}), 400
+        
+        image_data = image_file.read()
+        image_size = len(image_data)
+        image_file.close()
+        
         # Verify blockchain signature if enabled
         if app.email_handler.blockchain_enabled:
             signature = request.headers.get('X-Blockchain-Signature')
-            if not app.email_handler.blockchain_client.verify_signature(
-                request.json,
+            # Multipart uploads carry the small signed envelope as a form field
+            message = request.form.get('message')
+            try:
+                envelope = orjson.loads(message) if message else None
+            except orjson.JSONDecodeError:
+                envelope = None
+            
+            if not signature or not isinstance(envelope, dict) or not app.email_handler.blockchain_client.verify_signature(
+                envelope,
                 signature
             ):
                 return jsonify({
                     'status': 'error',
                     'message': 'Invalid blockchain signature'
                 }), 401
-        
-        if 'image' not in request.files:
-            return jsonify({'status': 'error', 'message': 'No image file'}), 400
             
-        image_file = request.files['image']
-        requester_email = request.form.get('requester_email')
-        request_id = request.form.get('request_id')
-        
-        if not requester_email:
-            return jsonify({'status': 'error', 'message': 'No requester email'}), 400
+            # A valid envelope only authenticates what it signs: the
+            # recipient, request and image used below must all be in it
+            signed = envelope.get('data')
+            if not isinstance(signed, dict) or (
+                signed.get('requester_email') != requester_email
+                or str(signed.get('request_id')) != str(request_id)
+                or signed.get('image_sha256') != hashlib.sha256(image_data).hexdigest()
+            ):
+                return jsonify({
+                    'status': 'error',
+                    'message': 'Signed payload does not match request'
+                }), 401
         
         # Create email with image
         msg = MIMEMultipart()
@@ -291,36 +473,38 @@ def send_image():
         """
         msg.attach(MIMEText(body, 'plain'))
         
-        # Add image attachment
-        image_data = image_file.read()
+        # Add image attachment; the raw upload is dropped once it is encoded
+        # so sending only holds the base64 part and the serialized message
         image = MIMEImage(image_data)
+        del image_data
         filename = image_file.filename or f'camera_image_{request_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.jpg'
         image.add_header('Content-Disposition', 'attachment', filename=filename)
         msg.attach(image)
         
-        # Send email with retry mechanism
+        # Send email, backing off exponentially between attempts
         max_retries = 3
-        retry_delay = 2
+        retry_delay = 0.2
         
         for attempt in range(max_retries):
             try:
-                with smtplib.SMTP_SSL('smtp.gmail.com', 465, timeout=30) as smtp:
-                    smtp.login(app.config['EMAIL_ADDRESS'], app.config['EMAIL_PASSWORD'])
-                    smtp.send_message(msg)
-                    print(f"Successfully sent image email to {requester_email}")
-                    break
+                app.email_handler.send_email(msg)
+                print(f"Successfully sent image email to {requester_email}")
+                break
+            except SMTPUnavailable:
+                raise
             except Exception as e:
                 if attempt == max_retries - 1:
                     raise
                 print(f"Email sending attempt {attempt + 1} failed: {str(e)}")
                 time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 1.5)
         
         # Record metrics
         app.email_handler.metrics_manager.record_delay(
             source_service='email-handler',
             destination_service='email-server',
             packet_id=f"img-{request_id}",
-            packet_size=len(image_data),
+            packet_size=image_size,
             delay_ms=(time.time() - start_time) * 1000,
             blockchain_enabled=app.email_handler.blockchain_enabled
         )
@@ -330,6 +514,11 @@ def send_image():
             'message': f'Image sent to {requester_email}'
         }), 200
         
+    except SMTPUnavailable as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 503
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -341,7 +530,8 @@ def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'healthy'}), 200
 
-if __name__ == "__main__":
+def init_service():
+    """Create the email handler service and start inbox monitoring"""
     # Initialize email handler service
     app.email_handler = EmailHandlerService()
     
@@ -351,6 +541,9 @@ if __name__ == "__main__":
     
     # Start email monitoring
     app.email_handler.start_monitoring()
+
+if __name__ == "__main__":
+    init_service()
     
     # Start Flask server
     print("Starting Email Handler Service...")
@@ -0,0 +1,15 @@
+import os
+
+bind = '0.0.0.0:30082'
+
+# Each worker would run its own inbox monitor and SMTP pool, so a single
+# worker handles every request. Concurrency comes from worker threads.
+workers = 1
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+keepalive = 30
+
+def post_fork(server, worker):
+    """Build the service inside the worker, after the fork"""
+    from email_handler_service import init_service
+    init_service()
@@ -1,12 +1,24 @@
+import base64
 import requests
-import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
 import time
 from eth_account import Account
-from web3 import Web3
+from eth_account.messages import encode_defunct
+from eth_hash.auto import keccak
 import socket
 import struct
 import threading
 from queue import Queue
+from collections import OrderedDict
+
+# Verdicts a BlockchainClient keeps for repeated invalid messages
+REJECTED_CACHE_SIZE = 4096
+
+# Seconds a rejection is trusted; a sender that was not yet registered
+# must be able to get the same message accepted once it has
+REJECTED_CACHE_TTL = 30
 
 class BlockchainClient:
     def __init__(self, service_id, private_key, blockchain_url):
@@ -14,8 +26,21 @@ class BlockchainClient:
         self.service_id = service_id
         self.account = Account.from_key(private_key)
         self.blockchain_url = blockchain_url
-        self.web3 = Web3()
         self.enabled = True
+        
+        # Keep-alive connection pool for calls to the blockchain service and
+        # peer services; dropped connections are re-established transparently
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(
+            pool_connections=8,
+            pool_maxsize=32,
+            max_retries=Retry(total=3, backoff_factor=0.2)
+        ))
+        
+        # Recently rejected (message hash, signature) pairs mapped to the
+        # monotonic time their rejection expires, oldest first
+        self._rejected = OrderedDict()
+        self._rejected_lock = threading.Lock()
 
     def register(self):
         """Register service with blockchain service"""
@@ -23,7 +48,7 @@ class BlockchainClient:
             return True
 
         try:
-            response = requests.post(
+            response = self.session.post(
                 f"{self.blockchain_url}/register",
                 json={
                     'service_id': self.service_id,
@@ -37,14 +62,35 @@ class BlockchainClient:
 
     def sign_message(self, message_data):
         """Sign a message with service's private key"""
-        message_hash = self.web3.keccak(text=json.dumps(message_data, sort_keys=True))
-        signed_message = self.account.sign_message(message_hash)
-        return signed_message.signature.hex()
+        return self.sign_bytes(orjson.dumps(message_data, option=orjson.OPT_SORT_KEYS))
+
+    def sign_bytes(self, payload):
+        """Sign already-canonical message bytes with service's private key"""
+        # base64 carries the 65-byte signature in 88 chars instead of 132 hex
+        return base64.b64encode(self.sign_raw(payload)).decode()
+
+    def sign_raw(self, payload):
+        """Sign message bytes and return the raw 65-byte signature"""
+        # Not cached: every payload embeds its sender and timestamp, so a
+        # repeated payload is a replay the verifier will refuse anyway
+        message_hash = keccak(payload)
+        signed_message = self.account.sign_message(encode_defunct(primitive=message_hash))
+        return bytes(signed_message.signature)
 
     def verify_signature(self, message_data, signature):
         """Verify a message signature"""
         try:
-            response = requests.post(
+            # Only rejections are cached; an accept must still pass the
+            # blockchain service's replay check every time
+            key = (keccak(orjson.dumps(message_data, option=orjson.OPT_SORT_KEYS)), signature)
+            with self._rejected_lock:
+                expires = self._rejected.get(key)
+                if expires is not None:
+                    if time.monotonic() < expires:
+                        return False
+                    del self._rejected[key]
+            
+            response = self.session.post(
                 f"{self.blockchain_url}/verify",
                 json={
                     'message': message_data,
@@ -52,7 +98,16 @@ class BlockchainClient:
                     'sender_id': message_data.get('sender_id')
                 }
             )
-            return response.status_code == 200 and response.json().get('is_valid')
+            if response.status_code != 200:
+                return False
+            
+            is_valid = response.json().get('is_valid')
+            if not is_valid:
+                with self._rejected_lock:
+                    self._rejected[key] = time.monotonic() + REJECTED_CACHE_TTL
+                    if len(self._rejected) > REJECTED_CACHE_SIZE:
+                        self._rejected.popitem(last=False)
+            return is_valid
         except Exception as e:
             print(f"Error verifying signature: {str(e)}")
             return False
@@ -61,7 +116,7 @@ class BlockchainClient:
         """Make a secure HTTP request"""
         if not self.enabled:
             # Make regular request without blockchain security
-            return requests.request(method, url, json=data, files=files)
+            return self.session.request(method, url, json=data, files=files)
 
         try:
             # Add timestamp and sign
@@ -71,7 +126,9 @@ class BlockchainClient:
                 'sender_id': self.service_id
             }
 
-            signature = self.sign_message(message_data)
+            # Serialize once: the signed canonical bytes are also the body
+            body = orjson.dumps(message_data, option=orjson.OPT_SORT_KEYS)
+            signature = self.sign_bytes(body)
 
             # Add blockchain headers
             headers = {
@@ -79,13 +136,21 @@ class BlockchainClient:
                 'X-Service-ID': self.service_id
             }
 
-            return requests.request(
-                method,
-                url,
-                json=message_data,
-                headers=headers,
-                files=files
-            )
+            if files is not None:
+                # requests drops json= alongside files, so the signed
+                # envelope travels as a form field of the multipart body,
+                # next to plain copies of the fields it signs; the receiver
+                # checks that the two agree
+                return self.session.request(
+                    method,
+                    url,
+                    data=dict(data or {}, message=body),
+                    headers=headers,
+                    files=files
+                )
+
+            headers['Content-Type'] = 'application/json'
+            return self.session.request(method, url, data=body, headers=headers)
 
         except Exception as e:
             print(f"Error making secure request: {str(e)}")
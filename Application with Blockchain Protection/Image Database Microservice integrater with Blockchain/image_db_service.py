@@ -2,8 +2,9 @@ from flask import Flask, request, jsonify
 import sqlite3
 import os
 from datetime import datetime
-import json
+import orjson
 import threading
+import struct
 from blockchain_client import BlockchainClient
 from metrics_manager import BlockchainMetricsManager
 from secure_socket import SecureSocket
@@ -11,6 +12,12 @@ import time
 
 app = Flask(__name__)
 
+RECV_CHUNK_SIZE = 64 * 1024
+
+# Unsecured metadata is preceded by its length as a 4-byte big-endian
+# integer, the same framing the camera's SecureSocket sends
+LENGTH_PREFIX = struct.Struct('!I')
+
 class ImageDBService:
     def __init__(self):
         # Initialize paths
@@ -111,17 +118,19 @@ class ImageDBService:
             }
             
             command_start = time.time()
+            # Serialized once for the wire and the size metric
+            command_bytes = orjson.dumps(command)
             if self.blockchain_enabled:
-                socket.send_secure(json.dumps(command))
+                socket.send_secure(command_bytes)
             else:
-                socket.sendall(json.dumps(command).encode())
+                socket.sendall(command_bytes)
             
             # Record command metrics
             self.metrics_manager.record_delay(
                 source_service='image-db',
                 destination_service='camera',
                 packet_id=f"cmd-{request_id}",
-                packet_size=len(json.dumps(command)),
+                packet_size=len(command_bytes),
                 delay_ms=(time.time() - command_start) * 1000,
                 blockchain_enabled=self.blockchain_enabled
             )
@@ -145,8 +154,10 @@ class ImageDBService:
                 if self.blockchain_enabled:
                     metadata = socket.receive_secure()
                 else:
-                    metadata_len = int(socket.recv(8).decode())
-                    metadata = json.loads(socket.recv(metadata_len).decode())
+                    metadata_len, = LENGTH_PREFIX.unpack(
+                        self._receive_image_data(socket, LENGTH_PREFIX.size)
+                    )
+                    metadata = orjson.loads(self._receive_image_data(socket, metadata_len))
                 
                 if metadata['type'] == 'end':
                     break
@@ -186,23 +197,25 @@ class ImageDBService:
     def _receive_image_data(self, socket, size):
         """Receive image data with or without blockchain security"""
         try:
-            image_data = bytearray()
-            remaining = size
+            if self.blockchain_enabled:
+                # One signed header carries the image digest, so the whole
+                # image is verified once rather than per chunk
+                return socket.receive_raw(size)
             
-            while remaining > 0:
-                chunk_size = min(remaining, 8192)
-                if self.blockchain_enabled:
-                    chunk = socket.receive_secure(chunk_size)
-                else:
-                    chunk = socket.recv(chunk_size)
+            # Read straight into one preallocated buffer, no per-chunk copies
+            image_data = bytearray(size)
+            view = memoryview(image_data)
+            received = 0
+            
+            while received < size:
+                n = socket.recv_into(view[received:], min(size - received, RECV_CHUNK_SIZE))
                 
-                if not chunk:
+                if not n:
                     raise Exception("Connection broken while receiving image")
                 
-                image_data.extend(chunk)
-                remaining -= len(chunk)
+                received += n
             
-            return bytes(image_data)
+            return image_data
             
         except Exception as e:
             print(f"Error receiving image data: {str(e)}")
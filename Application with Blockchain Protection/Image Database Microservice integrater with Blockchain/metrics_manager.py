@@ -1,11 +1,65 @@
 import os
+import atexit
+import csv
+import io
+import numpy as np
 import pandas as pd
+from collections import deque
 from datetime import datetime
+from itertools import groupby
 import psutil
 import time
 import threading
 from pathlib import Path
 
+METRIC_COLUMNS = {
+    'delay': [
+        'timestamp', 'source_service', 'destination_service',
+        'packet_id', 'packet_size', 'delay_ms', 'blockchain_enabled'
+    ],
+    'memory': [
+        'timestamp', 'service_name', 'memory_usage_mb',
+        'blockchain_enabled', 'total_memory_mb', 'memory_percent'
+    ],
+    'cpu': [
+        'timestamp', 'service_name', 'cpu_percent',
+        'blockchain_enabled', 'core_count', 'cpu_freq_mhz'
+    ]
+}
+
+# Low-cardinality string columns, loaded as categoricals for grouping
+CATEGORY_COLUMNS = ('source_service', 'destination_service', 'service_name')
+
+# Grouping and statistics of each metric's summary; the blockchain vs
+# normal comparisons are rolled up from these same groups
+SUMMARY_KEYS = {
+    'delay': ('timestamp', 'blockchain_enabled', 'source_service', 'destination_service'),
+    'memory': ('service_name', 'blockchain_enabled'),
+    'cpu': ('service_name', 'blockchain_enabled')
+}
+SUMMARY_STATS = {
+    'delay': {
+        'delay_ms': ['mean', 'min', 'max', 'std'],
+        'packet_size': ['mean', 'sum']
+    },
+    'memory': {
+        'memory_usage_mb': ['mean', 'max'],
+        'memory_percent': ['mean']
+    },
+    'cpu': {
+        'cpu_percent': ['mean', 'max']
+    }
+}
+
+# Excel writer for the summary and comparison reports. They are small and
+# rewritten every cycle, and xlsxwriter emits them without building an
+# openpyxl workbook model first
+REPORT_ENGINE = 'xlsxwriter'
+
+# Seconds after midnight before the previous day's raw file is treated as
+# complete; covers rows still sitting in the flush buffer at rotation time
+ROTATION_GRACE = 3600
+
 class BlockchainMetricsManager:
     def __init__(self, base_path="/app/metrics"):
         """Initialize the metrics manager"""
@@ -19,8 +73,40 @@ class BlockchainMetricsManager:
             'cpu': threading.Lock()
         }
         
-        # Initialize DataFrames
-        self._initialize_dataframes()
+        # Rows are buffered in memory and written to the files in batches
+        self._buffers = {kind: deque() for kind in METRIC_COLUMNS}
+        self._buffer_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._summary_event = threading.Event()  # set once new rows are on disk
+        self._summary_interval = 300  # seconds; regenerate at most this often
+        self._flush_interval = 60  # seconds
+        self._flush_threshold = 512
+        self._max_buffered = 100000  # per metric; beyond this rows are dropped
+        self.dropped_rows = 0
+        self._dropped_reported = 0
+        
+        # Process handle and host values that stay fixed for the container
+        self._process = psutil.Process()
+        self._process.cpu_percent(interval=None)  # prime the non-blocking sampler
+        self._core_count = psutil.cpu_count()
+        self._total_memory_mb = psutil.virtual_memory().total / 1024 / 1024
+        self._cpu_freq_mhz = 0
+        self._cpu_freq_checked = 0
+        
+        # (epoch second, ISO string) of the last formatted timestamp
+        self._timestamp_cache = (None, None)
+        
+        # Partial aggregates of completed raw files, keyed by (metric, file),
+        # and (bytes consumed, partial) of files that are still growing
+        self._partials = {}
+        self._open_partials = {}
+        
+        # Raw file sizes the current reports were generated from
+        self._summarized_state = None
+        
+        # Flush periodically and on shutdown
+        atexit.register(self.flush)
+        self.start_flush_thread()
         
         # Start periodic cleanup and summary generation
         self.start_cleanup_thread()
@@ -38,105 +124,139 @@ class BlockchainMetricsManager:
             full_path = self.base_path / dir_path
             full_path.mkdir(parents=True, exist_ok=True)
 
-    def _initialize_dataframes(self):
-        """Initialize Excel files with headers if they don't exist"""
-        files_and_headers = {
-            'delay/raw_data.xlsx': [
-                'timestamp', 'source_service', 'destination_service',
-                'packet_id', 'packet_size', 'delay_ms', 'blockchain_enabled'
-            ],
-            'memory/raw_data.xlsx': [
-                'timestamp', 'service_name', 'memory_usage_mb',
-                'blockchain_enabled', 'total_memory_mb', 'memory_percent'
-            ],
-            'cpu/raw_data.xlsx': [
-                'timestamp', 'service_name', 'cpu_percent',
-                'blockchain_enabled', 'core_count', 'cpu_freq_mhz'
-            ]
-        }
-        
-        for file_path, headers in files_and_headers.items():
-            full_path = self.base_path / file_path
-            if not full_path.exists():
-                df = pd.DataFrame(columns=headers)
-                df.to_excel(full_path, index=False)
+    def _raw_path(self, kind, day):
+        """Raw data CSV for one metric and day (YYYY-MM-DD)"""
+        return self.base_path / f'{kind}/raw_data-{day}.csv'
 
     def record_delay(self, source_service, destination_service, packet_id, 
                     packet_size, delay_ms, blockchain_enabled):
         """Record packet delay metrics"""
-        with self.file_locks['delay']:
-            try:
-                file_path = self.base_path / 'delay/raw_data.xlsx'
-                df = pd.read_excel(file_path)
-                
-                new_row = {
-                    'timestamp': datetime.now().isoformat(),
-                    'source_service': source_service,
-                    'destination_service': destination_service,
-                    'packet_id': packet_id,
-                    'packet_size': packet_size,
-                    'delay_ms': delay_ms,
-                    'blockchain_enabled': blockchain_enabled
-                }
-                
-                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                df.to_excel(file_path, index=False)
-                
-            except Exception as e:
-                print(f"Error recording delay metrics: {str(e)}")
+        self._buffer_row('delay', (
+            self._timestamp(),
+            source_service,
+            destination_service,
+            packet_id,
+            packet_size,
+            delay_ms,
+            blockchain_enabled
+        ))
 
     def record_memory_usage(self, service_name, blockchain_enabled):
         """Record memory usage metrics"""
-        with self.file_locks['memory']:
-            try:
-                file_path = self.base_path / 'memory/raw_data.xlsx'
-                df = pd.read_excel(file_path)
-                
-                process = psutil.Process()
-                memory_info = process.memory_info()
-                
-                new_row = {
-                    'timestamp': datetime.now().isoformat(),
-                    'service_name': service_name,
-                    'memory_usage_mb': memory_info.rss / 1024 / 1024,
-                    'blockchain_enabled': blockchain_enabled,
-                    'total_memory_mb': psutil.virtual_memory().total / 1024 / 1024,
-                    'memory_percent': process.memory_percent()
-                }
-                
-                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                df.to_excel(file_path, index=False)
-                
-            except Exception as e:
-                print(f"Error recording memory metrics: {str(e)}")
+        try:
+            memory_usage_mb = self._process.memory_info().rss / 1024 / 1024
+            
+            self._buffer_row('memory', (
+                self._timestamp(),
+                service_name,
+                memory_usage_mb,
+                blockchain_enabled,
+                self._total_memory_mb,
+                memory_usage_mb / self._total_memory_mb * 100
+            ))
+            
+        except Exception as e:
+            print(f"Error recording memory metrics: {str(e)}")
 
     def record_cpu_usage(self, service_name, blockchain_enabled):
         """Record CPU usage metrics"""
-        with self.file_locks['cpu']:
-            try:
-                file_path = self.base_path / 'cpu/raw_data.xlsx'
-                df = pd.read_excel(file_path)
-                
-                process = psutil.Process()
-                
-                new_row = {
-                    'timestamp': datetime.now().isoformat(),
-                    'service_name': service_name,
-                    'cpu_percent': process.cpu_percent(),
-                    'blockchain_enabled': blockchain_enabled,
-                    'core_count': psutil.cpu_count(),
-                    'cpu_freq_mhz': psutil.cpu_freq().current if psutil.cpu_freq() else 0
-                }
-                
-                df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-                df.to_excel(file_path, index=False)
-                
-            except Exception as e:
-                print(f"Error recording CPU metrics: {str(e)}")
+        try:
+            self._buffer_row('cpu', (
+                self._timestamp(),
+                service_name,
+                self._process.cpu_percent(interval=None),
+                blockchain_enabled,
+                self._core_count,
+                self._get_cpu_freq()
+            ))
+            
+        except Exception as e:
+            print(f"Error recording CPU metrics: {str(e)}")
+
+    def _get_cpu_freq(self):
+        """Current CPU frequency in MHz, re-read at most once a minute"""
+        now = time.monotonic()
+        if now - self._cpu_freq_checked >= 60:
+            cpu_freq = psutil.cpu_freq()
+            self._cpu_freq_mhz = cpu_freq.current if cpu_freq else 0
+            self._cpu_freq_checked = now
+        return self._cpu_freq_mhz
+
+    def _timestamp(self):
+        """Current time as ISO text at one-second resolution, formatted once per second"""
+        second = int(time.time())
+        cached = self._timestamp_cache
+        if cached[0] != second:
+            cached = self._timestamp_cache = (second, datetime.fromtimestamp(second).isoformat())
+        return cached[1]
+
+    def _buffer_row(self, kind, row):
+        """Queue a metrics row, waking the flush thread once the buffer is full"""
+        with self._buffer_lock:
+            buffer = self._buffers[kind]
+            if len(buffer) >= self._max_buffered:
+                # Writes are not keeping up; drop instead of blocking the caller
+                self.dropped_rows += 1
+                return
+            buffer.append(row)
+            full = len(buffer) >= self._flush_threshold
+        if full:
+            self._flush_event.set()
+
+    def flush(self):
+        """Append all buffered rows to their daily raw data CSV files"""
+        dropped = self.dropped_rows - self._dropped_reported
+        if dropped:
+            print(f"Warning: dropped {dropped} metric rows since the last flush")
+            self._dropped_reported += dropped
+        written = False
+        for kind in METRIC_COLUMNS:
+            # Swap the buffer out so recording never waits on file I/O
+            with self._buffer_lock:
+                rows = self._buffers[kind]
+                if not rows:
+                    continue
+                self._buffers[kind] = deque()
+            
+            with self.file_locks[kind]:
+                try:
+                    # Append-only: cost is proportional to the new rows alone.
+                    # Rows arrive in time order, so each day is one run.
+                    for day, day_rows in groupby(rows, key=lambda row: row[0][:10]):
+                        file_path = self._raw_path(kind, day)
+                        write_header = not file_path.exists()
+                        with open(file_path, 'a', newline='', buffering=1 << 16) as f:
+                            writer = csv.writer(f)
+                            if write_header:
+                                writer.writerow(METRIC_COLUMNS[kind])
+                            writer.writerows(day_rows)
+                    written = True
+                    
+                except Exception as e:
+                    print(f"Error flushing {kind} metrics: {str(e)}")
+        
+        if written:
+            self._summary_event.set()
+
+    def start_flush_thread(self):
+        """Start a background thread that writes buffered metrics out"""
+        def flush_task():
+            while True:
+                self._flush_event.wait(self._flush_interval)
+                self._flush_event.clear()
+                self.flush()
+
+        flush_thread = threading.Thread(target=flush_task, daemon=True)
+        flush_thread.start()
 
     def generate_summaries(self):
         """Generate summary reports for all metrics"""
         try:
+            # Nothing was flushed since the last cycle; the reports still hold
+            state = self._raw_state()
+            if state == self._summarized_state:
+                return
+            
             # Generate delay summaries
             self._generate_delay_summaries()
             
@@ -149,28 +269,128 @@ class BlockchainMetricsManager:
             # Generate comparison reports
             self._generate_comparison_reports()
             
+            self._summarized_state = state
+            
         except Exception as e:
             print(f"Error generating summaries: {str(e)}")
 
+    def _raw_state(self):
+        """Names and sizes of all raw data files; files are only ever appended to"""
+        return tuple(
+            (file_path.name, file_path.stat().st_size)
+            for kind in SUMMARY_KEYS
+            for file_path in sorted((self.base_path / kind).glob('raw_data*.csv'))
+        )
+
+    def _read_raw(self, kind, source, columns, header=True):
+        """Load the given raw data columns, with service names as categoricals"""
+        return pd.read_csv(
+            source,
+            header=0 if header else None,
+            names=None if header else METRIC_COLUMNS[kind],
+            usecols=columns,
+            dtype={column: 'category' for column in columns if column in CATEGORY_COLUMNS}
+        )
+
+    def _read_new_rows(self, kind, file_path):
+        """Partial aggregate of a raw file, parsing only rows appended since the last call"""
+        cache_key = (kind, file_path.name)
+        offset, partial = self._open_partials.get(cache_key, (0, None))
+        
+        # flush() writes whole rows under the same lock, so the tail never
+        # ends mid-row
+        with self.file_locks[kind]:
+            with open(file_path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        
+        if data:
+            tail = self._partial_aggregate(kind, io.BytesIO(data), header=offset == 0)
+            partial = tail if partial is None else self._merge_partials(
+                kind, [partial, tail], SUMMARY_KEYS[kind]
+            )
+            offset += len(data)
+        self._open_partials[cache_key] = (offset, partial)
+        return partial
+
+    def _partial_aggregate(self, kind, source, header=True):
+        """Mergeable per-group count, sum, sum of squares, min and max of raw rows"""
+        keys, stats = SUMMARY_KEYS[kind], SUMMARY_STATS[kind]
+        df = self._read_raw(kind, source, list(keys) + list(stats), header)
+        if 'timestamp' in keys:
+            # Summaries group on the calendar day of the timestamp
+            df['timestamp'] = pd.to_datetime(df['timestamp']).dt.date
+        df = df.assign(**{f'{column}_sq': df[column] ** 2 for column in stats})
+        
+        agg = {column: ['count', 'sum', 'min', 'max'] for column in stats}
+        agg.update({f'{column}_sq': ['sum'] for column in stats})
+        return df.groupby(list(keys), observed=True).agg(agg)
+
+    def _merge_partials(self, kind, partials, levels):
+        """Combine partial aggregates, grouping on the given index levels"""
+        merge = {}
+        for column in SUMMARY_STATS[kind]:
+            merge.update({
+                (column, 'count'): 'sum', (column, 'sum'): 'sum',
+                (column, 'min'): 'min', (column, 'max'): 'max',
+                (f'{column}_sq', 'sum'): 'sum'
+            })
+        return pd.concat(partials).groupby(level=list(levels), observed=True).agg(merge)
+
+    def _aggregate(self, kind, rollup=None):
+        """Per-group statistics over all raw files of a metric.
+
+        Files of finished days never change, so their partial aggregates are
+        computed once and reused; of the current day only the rows appended
+        since the previous cycle are parsed. With rollup, the merged partials are further combined down to those
+        index levels, which touches only the few summary rows.
+        """
+        cutoff = datetime.fromtimestamp(time.time() - ROTATION_GRACE).date().isoformat()
+        partials = []
+        for file_path in sorted((self.base_path / kind).glob('raw_data*.csv')):
+            day = file_path.stem[len('raw_data-'):]
+            cache_key = (kind, file_path.name)
+            partial = self._partials.get(cache_key)
+            if partial is None:
+                partial = self._read_new_rows(kind, file_path)
+                # The legacy undated raw_data.csv sorts before every day
+                if day < cutoff and partial is not None:
+                    self._partials[cache_key] = partial
+                    del self._open_partials[cache_key]
+            if partial is not None:
+                partials.append(partial)
+        
+        if not partials:
+            return pd.DataFrame()
+        
+        stats = SUMMARY_STATS[kind]
+        combined = self._merge_partials(kind, partials, rollup or SUMMARY_KEYS[kind])
+        
+        result = {}
+        for column, names in stats.items():
+            count = combined[(column, 'count')]
+            total = combined[(column, 'sum')]
+            for name in names:
+                if name == 'mean':
+                    value = total / count
+                elif name == 'std':
+                    squares = combined[(f'{column}_sq', 'sum')]
+                    variance = (squares - total ** 2 / count) / (count - 1)
+                    value = np.sqrt(variance.clip(lower=0))
+                else:
+                    value = combined[(column, name)]
+                result[(column, name)] = value
+        return pd.DataFrame(result).reset_index()
+
     def _generate_delay_summaries(self):
         """Generate delay metric summaries"""
         try:
-            delay_df = pd.read_excel(self.base_path / 'delay/raw_data.xlsx')
-            delay_df['timestamp'] = pd.to_datetime(delay_df['timestamp'])
-            
             # Daily summary
-            daily_delay = delay_df.groupby([
-                delay_df['timestamp'].dt.date,
-                'blockchain_enabled',
-                'source_service',
-                'destination_service'
-            ]).agg({
-                'delay_ms': ['mean', 'min', 'max', 'std'],
-                'packet_size': ['mean', 'sum']
-            }).reset_index()
+            daily_delay = self._aggregate('delay')
             
             daily_delay.to_excel(
-                self.base_path / 'delay/summaries/daily_summary.xlsx'
+                self.base_path / 'delay/summaries/daily_summary.xlsx',
+                engine=REPORT_ENGINE
             )
             
         except Exception as e:
@@ -179,20 +399,12 @@ class BlockchainMetricsManager:
     def _generate_memory_summaries(self):
         """Generate memory usage summaries"""
         try:
-            memory_df = pd.read_excel(self.base_path / 'memory/raw_data.xlsx')
-            memory_df['timestamp'] = pd.to_datetime(memory_df['timestamp'])
-            
             # Service summary
-            service_memory = memory_df.groupby([
-                'service_name',
-                'blockchain_enabled'
-            ]).agg({
-                'memory_usage_mb': ['mean', 'max'],
-                'memory_percent': 'mean'
-            }).reset_index()
+            service_memory = self._aggregate('memory')
             
             service_memory.to_excel(
-                self.base_path / 'memory/summaries/service_summary.xlsx'
+                self.base_path / 'memory/summaries/service_summary.xlsx',
+                engine=REPORT_ENGINE
             )
             
         except Exception as e:
@@ -201,19 +413,12 @@ class BlockchainMetricsManager:
     def _generate_cpu_summaries(self):
         """Generate CPU usage summaries"""
         try:
-            cpu_df = pd.read_excel(self.base_path / 'cpu/raw_data.xlsx')
-            cpu_df['timestamp'] = pd.to_datetime(cpu_df['timestamp'])
-            
             # Service summary
-            service_cpu = cpu_df.groupby([
-                'service_name',
-                'blockchain_enabled'
-            ]).agg({
-                'cpu_percent': ['mean', 'max']
-            }).reset_index()
+            service_cpu = self._aggregate('cpu')
             
             service_cpu.to_excel(
-                self.base_path / 'cpu/summaries/service_summary.xlsx'
+                self.base_path / 'cpu/summaries/service_summary.xlsx',
+                engine=REPORT_ENGINE
             )
             
         except Exception as e:
@@ -223,47 +428,45 @@ class BlockchainMetricsManager:
         """Generate blockchain vs non-blockchain comparison reports"""
         try:
             # Delay comparison
-            delay_df = pd.read_excel(self.base_path / 'delay/raw_data.xlsx')
-            delay_comparison = delay_df.groupby('blockchain_enabled').agg({
-                'delay_ms': ['mean', 'min', 'max', 'std'],
-                'packet_size': ['mean', 'sum']
-            }).reset_index()
+            delay_comparison = self._aggregate('delay', rollup=('blockchain_enabled',))
             
             delay_comparison.to_excel(
-                self.base_path / 'comparisons/blockchain_vs_normal_delay.xlsx'
+                self.base_path / 'comparisons/blockchain_vs_normal_delay.xlsx',
+                engine=REPORT_ENGINE
             )
             
             # Memory comparison
-            memory_df = pd.read_excel(self.base_path / 'memory/raw_data.xlsx')
-            memory_comparison = memory_df.groupby('blockchain_enabled').agg({
-                'memory_usage_mb': ['mean', 'max'],
-                'memory_percent': 'mean'
-            }).reset_index()
+            memory_comparison = self._aggregate('memory', rollup=('blockchain_enabled',))
             
             memory_comparison.to_excel(
-                self.base_path / 'comparisons/blockchain_vs_normal_memory.xlsx'
+                self.base_path / 'comparisons/blockchain_vs_normal_memory.xlsx',
+                engine=REPORT_ENGINE
             )
             
             # CPU comparison
-            cpu_df = pd.read_excel(self.base_path / 'cpu/raw_data.xlsx')
-            cpu_comparison = cpu_df.groupby('blockchain_enabled').agg({
-                'cpu_percent': ['mean', 'max']
-            }).reset_index()
+            cpu_comparison = self._aggregate('cpu', rollup=('blockchain_enabled',))
             
             cpu_comparison.to_excel(
-                self.base_path / 'comparisons/blockchain_vs_normal_cpu.xlsx'
+                self.base_path / 'comparisons/blockchain_vs_normal_cpu.xlsx',
+                engine=REPORT_ENGINE
             )
             
         except Exception as e:
             print(f"Error generating comparison reports: {str(e)}")
 
     def start_cleanup_thread(self):
-        """Start a background thread for periodic cleanup and summary generation"""
+        """Start a background thread that regenerates summaries as new rows are flushed"""
         def cleanup_task():
+            # Summarise whatever is already on disk at startup
+            self._summary_event.set()
             while True:
+                # Idle until a flush writes rows; let a burst of flushes settle
+                self._summary_event.wait()
+                time.sleep(2)
+                self._summary_event.clear()
                 try:
                     self.generate_summaries()
-                    time.sleep(300)  # Generate summaries every 5 minutes
+                    time.sleep(self._summary_interval)
                 except Exception as e:
                     print(f"Error in cleanup task: {str(e)}")
                     time.sleep(60)
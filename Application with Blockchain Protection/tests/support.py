@@ -0,0 +1,67 @@
+"""Shared fixtures: load service modules by path and run the verifier in-process"""
+import importlib.util
+import os
+import sys
+import threading
+from collections import deque
+from urllib.parse import urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BLOCKCHAIN_DIR = os.path.join(ROOT, 'Blockchain microservice')
+CAMERA_DIR = os.path.join(ROOT, 'Camera Microservice integrated with Blockchain')
+EMAIL_DIR = os.path.join(ROOT, 'Email handler microservice integrated with Blockchain')
+
+CAMERA_KEY = '0x' + '11' * 32
+IMAGE_DB_KEY = '0x' + '22' * 32
+EMAIL_KEY = '0x' + '33' * 32
+
+def load_module(name, directory, filename=None):
+    """Import a service module by file path, with its directory importable"""
+    if name in sys.modules:
+        return sys.modules[name]
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(directory, filename or f'{name}.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+blockchain_service = load_module('blockchain_service', BLOCKCHAIN_DIR)
+
+def make_verifier():
+    """BlockchainService without metrics or its state directory"""
+    service = blockchain_service.BlockchainService.__new__(blockchain_service.BlockchainService)
+    service.services = {}
+    service.cache_shards = [dict() for _ in range(blockchain_service.CACHE_SHARDS)]
+    service.cache_locks = [threading.Lock() for _ in range(blockchain_service.CACHE_SHARDS)]
+    service.cache_order = deque()
+    service.locks = {'services': threading.Lock(), 'cache_order': threading.Lock()}
+    service.metrics_enabled = False
+    return service
+
+class Response:
+    """The parts of a requests.Response the clients read, from a Flask test response"""
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.text = response.get_data(as_text=True)
+        self._json = response.get_json(silent=True)
+
+    def json(self):
+        return self._json
+
+class TestClientSession:
+    """Routes a BlockchainClient's blockchain calls to the Flask app in-process"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def post(self, url, json=None):
+        return Response(self.client.post(urlparse(url).path, json=json))
+
+def start_verifier(test_case):
+    """Install a fresh verifier on the blockchain app; returns a session to it"""
+    app = blockchain_service.app
+    app.blockchain_service = make_verifier()
+    return TestClientSession(app)
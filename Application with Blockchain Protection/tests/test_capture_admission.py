@@ -0,0 +1,52 @@
+"""The camera service sheds start_capture requests beyond its capture slots"""
+import socket
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from support import CAMERA_DIR, load_module
+
+camera_service = load_module('camera_service', CAMERA_DIR)
+
+class CaptureAdmissionTest(unittest.TestCase):
+    def setUp(self):
+        self.service = camera_service.CameraService.__new__(camera_service.CameraService)
+        self.service.blockchain_enabled = False
+        self.service._capture_pool = ThreadPoolExecutor(max_workers=1)
+        self.service._capture_slots = threading.BoundedSemaphore(2)
+        self.addCleanup(self.service._capture_pool.shutdown)
+
+        self.camera_free = threading.Event()
+        self.addCleanup(self.camera_free.set)
+        self.captured = []
+
+        def capture_and_send(client_socket, request_id, requester_email):
+            self.camera_free.wait()
+            self.captured.append(request_id)
+            client_socket.close()
+
+        self.service.capture_and_send = capture_and_send
+
+    def start_capture(self, request_id):
+        client, server = socket.socketpair()
+        self.addCleanup(client.close)
+        camera_service.StandardSocket(client).send(camera_service.orjson.dumps(
+            {'command': 'start_capture', 'request_id': request_id}
+        ))
+        return self.service.handle_client(server, ('camera-client', request_id))
+
+    def test_captures_beyond_slots_are_rejected(self):
+        self.assertEqual([self.start_capture(n) for n in range(4)], [True, True, False, False])
+
+        self.camera_free.set()
+        self.service._capture_pool.shutdown(wait=True)
+        self.assertEqual(self.captured, [0, 1])
+
+    def test_slot_is_freed_when_capture_finishes(self):
+        self.camera_free.set()
+        for n in range(4):
+            self.assertTrue(self.start_capture(n))
+            self.service._capture_pool.submit(lambda: None).result()
+
+if __name__ == '__main__':
+    unittest.main()
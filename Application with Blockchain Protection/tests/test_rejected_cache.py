@@ -0,0 +1,38 @@
+"""BlockchainClient's cache of rejected messages expires"""
+import time
+import unittest
+from unittest import mock
+
+from support import EMAIL_DIR, EMAIL_KEY, IMAGE_DB_KEY, load_module, start_verifier
+
+blockchain_client = load_module('blockchain_client', EMAIL_DIR)
+
+class RejectedCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.session = start_verifier(self)
+        self.receiver = blockchain_client.BlockchainClient('email-handler', EMAIL_KEY, 'http://blockchain')
+        self.sender = blockchain_client.BlockchainClient('image-db', IMAGE_DB_KEY, 'http://blockchain')
+        for client in (self.receiver, self.sender):
+            client.session = self.session
+        self.assertTrue(self.receiver.register())
+
+        self.message = {'timestamp': int(time.time()), 'data': {'n': 1}, 'sender_id': 'image-db'}
+        self.signature = self.sender.sign_message(self.message)
+
+    def test_rejection_is_cached_within_ttl(self):
+        self.assertFalse(self.receiver.verify_signature(self.message, self.signature))
+
+        with mock.patch.object(self.session, 'post') as post:
+            self.assertFalse(self.receiver.verify_signature(self.message, self.signature))
+        post.assert_not_called()
+
+    def test_sender_registered_after_rejection_is_accepted_once_ttl_passes(self):
+        self.assertFalse(self.receiver.verify_signature(self.message, self.signature))
+        self.assertTrue(self.sender.register())
+
+        later = time.monotonic() + blockchain_client.REJECTED_CACHE_TTL + 1
+        with mock.patch('time.monotonic', return_value=later):
+            self.assertTrue(self.receiver.verify_signature(self.message, self.signature))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""End-to-end checks of the camera's SecureSocket framing against the verifier"""
+import os
+import socket
+import threading
+import time
+import unittest
+from unittest import mock
+
+from support import CAMERA_DIR, CAMERA_KEY, IMAGE_DB_KEY, load_module, start_verifier
+
+camera_service = load_module('camera_service', CAMERA_DIR)
+
+class SecureFrameTest(unittest.TestCase):
+    def setUp(self):
+        session = start_verifier(self)
+        self.camera = camera_service.BlockchainClient('camera', CAMERA_KEY, 'http://blockchain')
+        self.image_db = camera_service.BlockchainClient('image-db', IMAGE_DB_KEY, 'http://blockchain')
+        for client in (self.camera, self.image_db):
+            client.session = session
+            self.assertTrue(client.register())
+
+        sender, receiver = socket.socketpair()
+        self.addCleanup(sender.close)
+        self.addCleanup(receiver.close)
+        self.sender = camera_service.SecureSocket(self.camera, sender)
+        self.receiver = camera_service.SecureSocket(self.image_db, receiver)
+
+        # Every envelope in a test is signed within the same second
+        clock = mock.patch('time.time', return_value=float(int(time.time())))
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def test_metadata_and_raw_frame_in_one_second_both_verify(self):
+        image = os.urandom(200000)
+        metadata = {'type': 'image', 'image_number': 1, 'size': len(image)}
+
+        writer = threading.Thread(target=self.sender.send_frames, args=(metadata, image))
+        writer.start()
+        received_metadata = self.receiver.receive()
+        received_image = self.receiver.receive_raw()
+        writer.join()
+
+        self.assertEqual(camera_service.orjson.loads(received_metadata), metadata)
+        self.assertEqual(bytes(received_image), image)
+
+    def test_consecutive_frames_in_one_second_all_verify(self):
+        images = [os.urandom(1000 + n) for n in range(3)]
+
+        def send_all():
+            for number, image in enumerate(images, 1):
+                self.sender.send_frames({'type': 'image', 'image_number': number}, image)
+
+        writer = threading.Thread(target=send_all)
+        writer.start()
+        for number, image in enumerate(images, 1):
+            self.assertEqual(camera_service.orjson.loads(self.receiver.receive())['image_number'], number)
+            self.assertEqual(bytes(self.receiver.receive_raw()), image)
+        writer.join()
+
+    def test_replayed_raw_frame_is_refused(self):
+        image = os.urandom(1000)
+        buffers = self.sender._raw_buffers(image)
+        frame = b''.join(bytes(buffer) for buffer in buffers)
+
+        self.sender.socket.sendall(frame + frame)
+        self.assertEqual(bytes(self.receiver.receive_raw()), image)
+        with self.assertRaises(Exception):
+            self.receiver.receive_raw()
+
+    def test_sender_id_too_long_for_raw_header_is_refused(self):
+        client = camera_service.BlockchainClient('camera-service-eu-1', CAMERA_KEY, 'http://blockchain')
+
+        with self.assertRaisesRegex(ValueError, 'camera-service-eu-1'):
+            camera_service.SecureSocket(client, self.sender.socket)
+
+if __name__ == '__main__':
+    unittest.main()
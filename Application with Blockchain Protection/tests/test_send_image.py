@@ -0,0 +1,113 @@
+"""The email handler's /send_image only emails what the sender signed"""
+import hashlib
+import io
+import os
+import unittest
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+from support import EMAIL_DIR, EMAIL_KEY, IMAGE_DB_KEY, Response, load_module, start_verifier
+
+email_handler_service = load_module('email_handler_service', EMAIL_DIR)
+blockchain_client = load_module('blockchain_client', EMAIL_DIR)
+
+class UploadSession:
+    """Sends a BlockchainClient's multipart requests to the email handler app"""
+
+    def __init__(self, verifier_session, app):
+        self.post = verifier_session.post
+        self.client = app.test_client()
+
+    def request(self, method, url, data=None, headers=None, files=None):
+        # requests sends bytes form values as-is; the test client wants text
+        form = {key: value.decode() if isinstance(value, bytes) else value
+                for key, value in (data or {}).items()}
+        for field, (filename, content, content_type) in (files or {}).items():
+            form[field] = (io.BytesIO(content), filename, content_type)
+        return Response(self.client.open(
+            urlparse(url).path, method=method, data=form, headers=headers,
+            content_type='multipart/form-data'
+        ))
+
+class SendImageTest(unittest.TestCase):
+    def setUp(self):
+        verifier_session = start_verifier(self)
+        app = email_handler_service.app
+
+        self.sent = []
+        verifier = blockchain_client.BlockchainClient('email-handler', EMAIL_KEY, 'http://blockchain')
+        verifier.session = verifier_session
+        app.email_handler = SimpleNamespace(
+            blockchain_enabled=True,
+            blockchain_client=verifier,
+            send_email=self.sent.append,
+            metrics_manager=SimpleNamespace(record_delay=lambda **kwargs: None)
+        )
+        app.config['EMAIL_ADDRESS'] = 'camera@example.com'
+
+        self.image_db = blockchain_client.BlockchainClient('image-db', IMAGE_DB_KEY, 'http://blockchain')
+        self.image_db.session = UploadSession(verifier_session, app)
+        for client in (verifier, self.image_db):
+            self.assertTrue(client.register())
+
+        self.image = b'\xff\xd8\xff\xdb' + os.urandom(5000)  # JPEG SOI + DQT
+
+    def send(self, data, image=None):
+        return self.image_db.secure_request(
+            'http://email-handler/send_image', 'POST', data=data,
+            files={'image': ('frame.jpg', image or self.image, 'image/jpeg')}
+        )
+
+    def signed_fields(self, **overrides):
+        fields = {
+            'request_id': '7',
+            'requester_email': 'user@example.com',
+            'image_sha256': hashlib.sha256(self.image).hexdigest()
+        }
+        fields.update(overrides)
+        return fields
+
+    def test_signed_request_is_emailed(self):
+        response = self.send(self.signed_fields())
+
+        self.assertEqual(response.status_code, 200, response.text)
+        self.assertEqual([msg['To'] for msg in self.sent], ['user@example.com'])
+
+    def test_unsigned_image_is_refused(self):
+        response = self.send(self.signed_fields(), image=os.urandom(5000))
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.sent, [])
+
+    def test_unsigned_recipient_is_refused(self):
+        original = self.image_db.session.request
+
+        def swap_recipient(method, url, data=None, **kwargs):
+            data = dict(data, requester_email='attacker@example.com')
+            return original(method, url, data=data, **kwargs)
+
+        self.image_db.session.request = swap_recipient
+        response = self.send(self.signed_fields())
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.sent, [])
+
+    def test_envelope_without_signed_fields_is_refused(self):
+        response = self.send({'requester_email': 'user@example.com'})
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.sent, [])
+
+    def test_malformed_envelope_is_unauthorized(self):
+        response = self.image_db.session.request(
+            'POST', 'http://email-handler/send_image',
+            data={'message': '{not json', 'requester_email': 'user@example.com'},
+            headers={'X-Blockchain-Signature': 'AAAA'},
+            files={'image': ('frame.jpg', self.image, 'image/jpeg')}
+        )
+
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(self.sent, [])
+
+if __name__ == '__main__':
+    unittest.main()
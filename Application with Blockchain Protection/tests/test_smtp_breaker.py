@@ -0,0 +1,89 @@
+"""The email handler's SMTP circuit breaker"""
+import threading
+import time
+import unittest
+from unittest import mock
+
+from support import EMAIL_DIR, load_module
+
+email_handler_service = load_module('email_handler_service', EMAIL_DIR)
+
+THRESHOLD = email_handler_service.SMTP_BREAKER_THRESHOLD
+
+class SMTPBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.handler = email_handler_service.EmailHandlerService.__new__(
+            email_handler_service.EmailHandlerService
+        )
+        self.handler._smtp_failures = 0
+        self.handler._smtp_open_until = 0
+        self.handler._smtp_trial = False
+        self.handler._smtp_breaker_lock = threading.Lock()
+
+        self.attempts = 0
+        self.smtp_down = True
+        self.handler._send_pooled = self.fake_send
+
+    def fake_send(self, msg):
+        self.attempts += 1
+        if self.smtp_down:
+            raise OSError("connection refused")
+
+    def fail_until_open(self):
+        for _ in range(THRESHOLD):
+            with self.assertRaises(OSError):
+                self.handler.send_email('msg')
+
+    def after_reset(self):
+        later = time.monotonic() + email_handler_service.SMTP_BREAKER_RESET + 1
+        return mock.patch('time.monotonic', return_value=later)
+
+    def test_open_circuit_fails_fast(self):
+        self.fail_until_open()
+
+        with self.assertRaises(email_handler_service.SMTPUnavailable):
+            self.handler.send_email('msg')
+        self.assertEqual(self.attempts, THRESHOLD)
+
+    def test_half_open_allows_one_trial_send(self):
+        self.fail_until_open()
+        trial_started = threading.Event()
+        release_trial = threading.Event()
+
+        def slow_send(msg):
+            trial_started.set()
+            release_trial.wait()
+
+        self.handler._send_pooled = slow_send
+        with self.after_reset():
+            trial = threading.Thread(target=self.handler.send_email, args=('msg',))
+            trial.start()
+            self.assertTrue(trial_started.wait(5))
+            with self.assertRaises(email_handler_service.SMTPUnavailable):
+                self.handler.send_email('msg')
+            release_trial.set()
+            trial.join()
+
+        self.assertEqual(self.handler._smtp_failures, 0)
+
+    def test_failed_trial_reopens_the_circuit(self):
+        self.fail_until_open()
+
+        with self.after_reset():
+            with self.assertRaises(OSError):
+                self.handler.send_email('msg')
+        with self.assertRaises(email_handler_service.SMTPUnavailable):
+            self.handler.send_email('msg')
+        self.assertEqual(self.attempts, THRESHOLD + 1)
+
+    def test_successful_trial_closes_the_circuit(self):
+        self.fail_until_open()
+        self.smtp_down = False
+
+        with self.after_reset():
+            self.handler.send_email('msg')
+        self.handler.send_email('msg')
+        self.assertEqual(self.attempts, THRESHOLD + 2)
+
+if __name__ == '__main__':
+    unittest.main()
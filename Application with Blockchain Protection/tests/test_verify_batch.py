@@ -0,0 +1,44 @@
+"""/verify_batch returns one boolean verdict per entry"""
+import time
+import unittest
+
+from support import CAMERA_DIR, CAMERA_KEY, blockchain_service, load_module, start_verifier
+
+camera_service = load_module('camera_service', CAMERA_DIR)
+
+class VerifyBatchTest(unittest.TestCase):
+    def setUp(self):
+        session = start_verifier(self)
+        self.camera = camera_service.BlockchainClient('camera', CAMERA_KEY, 'http://blockchain')
+        self.camera.session = session
+        self.assertTrue(self.camera.register())
+        self.client = blockchain_service.app.test_client()
+
+    def entry(self, n):
+        message = {'timestamp': int(time.time()), 'data': {'n': n}, 'sender_id': 'camera'}
+        return {'message': message, 'signature': self.camera.sign_message(message), 'sender_id': 'camera'}
+
+    def verify_batch(self, messages):
+        response = self.client.post('/verify_batch', json={'messages': messages})
+        self.assertEqual(response.status_code, 200, response.get_data(as_text=True))
+        return response.get_json()['is_valid']
+
+    def test_each_entry_gets_its_own_verdict(self):
+        tampered = self.entry(2)
+        tampered['message']['data'] = {'n': 3}
+
+        self.assertEqual(self.verify_batch([self.entry(1), tampered]), [True, False])
+
+    def test_malformed_entries_are_false_without_failing_the_batch(self):
+        results = self.verify_batch([
+            'not an object',
+            None,
+            {'message': None, 'signature': '', 'sender_id': 'camera'},
+            {'signature': 'AAAA'},
+            self.entry(1)
+        ])
+
+        self.assertEqual(results, [False, False, False, False, True])
+
+if __name__ == '__main__':
+    unittest.main()
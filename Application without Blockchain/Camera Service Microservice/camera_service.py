@@ -1,8 +1,10 @@
 #!/usr/bin/env python3
 
 import socket
+import atexit
 import json
 import cv2
+import numpy as np
 import time
 import requests
 from datetime import datetime
@@ -12,10 +14,68 @@ import io
 import subprocess
 import sys
 import struct
+from queue import Queue, Empty, Full
+
+try:
+    from turbojpeg import TurboJPEG
+except ImportError:
+    TurboJPEG = None
+
+# One write per log line, without '-u' splitting each print into
+# separate writes for the text and its newline; flush() calls then
+# have nothing left to write
+sys.stdout.reconfigure(line_buffering=True)
 
 print("Starting Camera Service...")
 sys.stdout.flush()
 
+# Every message is preceded by its length as a 4-byte big-endian integer
+LENGTH_PREFIX = struct.Struct('!I')
+
+# JPEG quality for encoded frames; the cv2 fallback also optimizes the
+# Huffman tables, trading a little encode time for smaller files
+JPEG_QUALITY = 70
+CV2_JPEG_PARAMS = [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY, int(cv2.IMWRITE_JPEG_OPTIMIZE), 1]
+
+# Capture session length and frame cadence, in seconds
+CAPTURE_DURATION = 120
+CAPTURE_INTERVAL = 10
+
+# Frames whose 64-bit average hash differs from the last sent frame's in
+# at most this many bits count as an unchanged scene
+STATIC_FRAME_MAX_BITS = 2
+
+def average_hash(gray):
+    """64-bit average hash of a grayscale image, as an int"""
+    small = cv2.resize(gray, (8, 8), interpolation=cv2.INTER_AREA)
+    return int.from_bytes(np.packbits(small > small.mean()).tobytes(), 'big')
+
+def sendmsg_all(sock, buffers):
+    """Send buffers in one scatter-gather call, resuming after partial writes"""
+    views = [memoryview(buf).cast('B') for buf in buffers]
+    while views:
+        sent = sock.sendmsg(views)
+        while views and sent >= len(views[0]):
+            sent -= len(views[0])
+            views.pop(0)
+        if views and sent:
+            views[0] = views[0][sent:]
+
+def add_jpeg_comment(image_data, text):
+    """Insert text as a JPEG COM segment after the SOI marker and JFIF header"""
+    comment = text.encode()
+    offset = 2
+    if image_data[2:4] == b'\xff\xe0':
+        # JFIF readers expect APP0 to come straight after SOI
+        offset += 2 + struct.unpack('>H', image_data[4:6])[0]
+    return b''.join((
+        image_data[:offset],
+        b'\xff\xfe',
+        struct.pack('>H', len(comment) + 2),
+        comment,
+        image_data[offset:]
+    ))
+
 class CameraService:
     def __init__(self):
         print("Initializing Camera Service...")
@@ -26,14 +86,40 @@ class CameraService:
         self.windows_zerotier_ip = os.getenv('WINDOWS_ZEROTIER_IP', '172.23.228.240')
         self.host = self.rpi_zerotier_ip  # Listen specifically on ZeroTier interface
         self.port = int(os.getenv('SERVICE_PORT', '5555'))
+        
+        # Camera state; the device stays open for the service lifetime
         self.camera = None
         self.capture_thread = None
         self.stop_capture = False
+        self._camera_lock = threading.Lock()
+        # Forward the camera's own MJPEG frames instead of decoding and re-encoding
+        self.mjpeg_passthrough = os.getenv('MJPEG_PASSTHROUGH', 'false').lower() == 'true'
+        # Skip encoding and sending frames of a scene that has not changed
+        self.skip_static_frames = os.getenv('SKIP_STATIC_FRAMES', 'false').lower() == 'true'
+        # Opt-in: keep each client's handler thread on one core
+        self.pin_handlers = (
+            os.getenv('PIN_HANDLER_CPU', 'false').lower() == 'true'
+            and hasattr(os, 'sched_setaffinity')
+        )
+        # Process CPU mask before any pinning; encode threads are reset to it
+        self.allowed_cpus = os.sched_getaffinity(0) if self.pin_handlers else None
+        
+        # SIMD libjpeg-turbo encoder when installed, cv2.imencode otherwise
+        self.turbo_jpeg = None
+        if TurboJPEG is not None:
+            try:
+                self.turbo_jpeg = TurboJPEG()
+            except OSError as e:
+                print(f"libjpeg-turbo not available, using OpenCV encoder: {str(e)}")
         
         print(f"Configuration loaded:")
         print(f"RPI ZeroTier IP: {self.rpi_zerotier_ip}")
         print(f"Windows ZeroTier IP: {self.windows_zerotier_ip}")
         print(f"Listening on: {self.host}:{self.port}")
+        print(f"MJPEG Passthrough: {self.mjpeg_passthrough}")
+        print(f"TurboJPEG Encoder: {self.turbo_jpeg is not None}")
+        print(f"Pin Handler CPU: {self.pin_handlers}")
+        print(f"Skip Static Frames: {self.skip_static_frames}")
         sys.stdout.flush()
 
     def init_camera(self):
@@ -52,6 +138,11 @@ class CameraService:
             self.camera.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc('M', 'J', 'P', 'G'))
             self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
             self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
+            # Keep the driver queue short so reads between requests stay fresh
+            self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            if self.mjpeg_passthrough:
+                # read() then returns the compressed JPEG bytes as they left the camera
+                self.camera.set(cv2.CAP_PROP_CONVERT_RGB, 0)
             
             print("Camera initialized successfully")
             sys.stdout.flush()
@@ -59,8 +150,19 @@ class CameraService:
         except Exception as e:
             print(f"Error initializing camera: {str(e)}")
             sys.stdout.flush()
+            if self.camera:
+                self.camera.release()
+                self.camera = None
             return False
 
+    def release_camera(self):
+        """Release the camera device on service shutdown"""
+        self.stop_capture = True
+        with self._camera_lock:
+            if self.camera:
+                self.camera.release()
+            self.camera = None
+
     def receive_ack(self, client_socket, expected_content=None):
         """Helper method to receive and validate acknowledgments"""
         try:
@@ -85,12 +187,19 @@ class CameraService:
             return False
 
     def capture_and_send(self, client_socket, request_id):
+        """Capture and send images, one request at a time on the shared camera"""
+        with self._camera_lock:
+            self._capture_and_send(client_socket, request_id)
+
+    def _capture_and_send(self, client_socket, request_id):
         """Capture images and send them to the client"""
-        start_time = time.time()
+        # Monotonic, so clock adjustments cannot stretch or cut the session
+        deadline = time.monotonic() + CAPTURE_DURATION
         image_count = 0
         
         try:
-            if not self.init_camera():
+            # Reopen only if the device was unavailable or has been lost
+            if self.camera is None and not self.init_camera():
                 print("Failed to initialize camera")
                 return
             
@@ -103,10 +212,9 @@ class CameraService:
                 'request_id': request_id
             }).encode()
             
-            # Send length of start message first
-            msg_len = str(len(start_message)).zfill(8).encode()
-            client_socket.sendall(msg_len)
-            client_socket.sendall(start_message)
+            # Send length of start message first, in the same segment
+            msg_len = LENGTH_PREFIX.pack(len(start_message))
+            client_socket.sendall(msg_len + start_message)
             
             # Wait for acknowledgment with retry
             retry_count = 3
@@ -123,77 +231,72 @@ class CameraService:
                 print("Failed to receive valid acknowledgment after retries")
                 return
             
-            while time.time() - start_time < 120 and not self.stop_capture:  # 2 minutes
-                try:
-                    # Capture frame
-                    ret, frame = self.camera.read()
-                    if not ret:
-                        print("Failed to capture frame, retrying...")
-                        time.sleep(1)
-                        continue
-                    
-                    # Add timestamp to the image
-                    timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                    cv2.putText(frame, timestamp, (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                    
-                    # Encode frame to JPEG with lower quality
-                    encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), 70]
-                    _, buffer = cv2.imencode('.jpg', frame, encode_param)
-                    image_data = buffer.tobytes()
-                    
-                    # Prepare image metadata
-                    metadata = json.dumps({
-                        'type': 'image',
-                        'request_id': request_id,
-                        'image_number': image_count + 1,
-                        'timestamp': timestamp,
-                        'size': len(image_data)
-                    }).encode()
-                    
-                    # Send metadata length, metadata, then image data
-                    metadata_len = str(len(metadata)).zfill(8).encode()
-                    client_socket.sendall(metadata_len)
-                    client_socket.sendall(metadata)
-                    
-                    # Send image data in chunks
-                    remaining = len(image_data)
-                    offset = 0
-                    chunk_size = 8192
-                    
-                    while remaining > 0:
-                        chunk = image_data[offset:offset + chunk_size]
-                        sent = client_socket.send(chunk)
-                        if sent == 0:
-                            raise socket.error("Connection broken")
-                        offset += sent
-                        remaining -= sent
-                    
-                    # Wait for image acknowledgment with retry
-                    if not self.receive_ack(client_socket, 'image_received'):
-                        raise socket.error("Failed to receive valid image acknowledgment")
-                    
-                    image_count += 1
-                    print(f"Successfully sent image {image_count}")
-                    
-                    # Wait before next capture
-                    time.sleep(10)
-                    
-                except socket.error as e:
-                    print(f"Socket error while sending: {str(e)}")
-                    break
-                except Exception as e:
-                    print(f"Error during capture/send: {str(e)}")
-                    break
+            # Pipeline: this thread grabs frames at the capture cadence and a
+            # worker encodes and sends them, so a slow send never delays a grab
+            frame_queue = Queue(maxsize=2)
+            stop_event = threading.Event()
+            progress = {'sent': 0}
+            sender = threading.Thread(
+                target=self._encode_and_send,
+                args=(frame_queue, client_socket, request_id, progress, stop_event)
+            )
+            sender.daemon = True
+            sender.start()
+            
+            try:
+                # Captures are scheduled on absolute deadlines so the time
+                # spent grabbing a frame does not accumulate as drift
+                next_capture = time.monotonic()
+                last_hash = None  # hash of the last frame handed to the sender
+                while (time.monotonic() < deadline and not self.stop_capture
+                       and not stop_event.is_set()):
+                    try:
+                        # Capture frame
+                        ret, frame = self.camera.read()
+                        if not ret:
+                            print("Failed to capture frame, retrying...")
+                            time.sleep(1)
+                            continue
+                        
+                        static = False
+                        if self.skip_static_frames:
+                            frame_hash = self.frame_hash(frame)
+                            static = (last_hash is not None and
+                                      bin(frame_hash ^ last_hash).count('1') <= STATIC_FRAME_MAX_BITS)
+                            if not static:
+                                last_hash = frame_hash
+                        
+                        if static:
+                            print("Scene unchanged, skipping frame")
+                        else:
+                            timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                            self._enqueue_frame(frame_queue, (frame, timestamp))
+                        
+                        # Wait for the next slot; skip slots already missed
+                        now = time.monotonic()
+                        next_capture = max(next_capture + CAPTURE_INTERVAL, now)
+                        stop_event.wait(next_capture - now)
+                        
+                    except Exception as e:
+                        print(f"Error during capture: {str(e)}")
+                        break
+            finally:
+                # Let the worker finish what is queued before the end message
+                frame_queue.put(None)
+                sender.join()
+                image_count = progress['sent']
                     
             print(f"Capture session completed. Sent {image_count} images.")
             
         except Exception as e:
             print(f"Error in capture_and_send: {str(e)}")
         finally:
-            if self.camera:
-                self.camera.release()
-            self.camera = None
             self.stop_capture = False
+            
+            # Drop a device that went away so the next request reopens it
+            if self.camera is not None and not self.camera.isOpened():
+                self.camera.release()
+                self.camera = None
             try:
                 # Send end message
                 end_message = json.dumps({
@@ -201,18 +304,120 @@ class CameraService:
                     'request_id': request_id,
                     'total_images': image_count
                 }).encode()
-                msg_len = str(len(end_message)).zfill(8).encode()
-                client_socket.sendall(msg_len)
-                client_socket.sendall(end_message)
+                msg_len = LENGTH_PREFIX.pack(len(end_message))
+                client_socket.sendall(msg_len + end_message)
             except Exception as e:
                 print(f"Error sending end message: {str(e)}")
 
+    def frame_hash(self, frame):
+        """Average hash of a captured frame, raw BGR or MJPEG passthrough"""
+        if self.mjpeg_passthrough:
+            # libjpeg scales by 1/8 while decoding, so this stays cheap
+            gray = cv2.imdecode(frame, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        else:
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return average_hash(gray)
+
+    def _enqueue_frame(self, frame_queue, item):
+        """Queue a captured frame, dropping the oldest one if the worker is behind"""
+        try:
+            frame_queue.put_nowait(item)
+        except Full:
+            try:
+                frame_queue.get_nowait()
+            except Empty:
+                pass
+            frame_queue.put_nowait(item)
+
+    def _encode_and_send(self, frame_queue, client_socket, request_id, progress, stop_event):
+        """Pipeline stage: JPEG-encode queued frames and send them to the client"""
+        # Metadata is the json.dumps output of the per-frame dict; only
+        # image_number, timestamp and size change within a session
+        metadata_prefix = b'{"type": "image", "request_id": %s, "image_number": ' % (
+            json.dumps(request_id).encode()
+        )
+        if self.pin_handlers:
+            # This thread inherited the handler's single-core mask; encoding
+            # must not compete with the capture loop for that one core
+            self.unpin_from_cpu()
+        try:
+            while True:
+                item = frame_queue.get()
+                if item is None:
+                    break
+                frame, timestamp = item
+                
+                # Encoded buffers are viewed in place; the comment
+                # insertion below makes the only copy
+                if self.mjpeg_passthrough:
+                    # Already JPEG as it left the camera
+                    image_data = memoryview(frame.reshape(-1))
+                elif self.turbo_jpeg is not None:
+                    image_data = self.turbo_jpeg.encode(frame, quality=JPEG_QUALITY)
+                else:
+                    _, buffer = cv2.imencode('.jpg', frame, CV2_JPEG_PARAMS)
+                    image_data = memoryview(buffer.reshape(-1))
+                
+                # Stamp the capture time into the file instead of
+                # rasterizing it into the pixels; it is also in the metadata
+                image_data = add_jpeg_comment(image_data, timestamp)
+                
+                # Prepare image metadata; the strftime timestamp needs no escaping
+                metadata = b'%s%d, "timestamp": "%s", "size": %d}' % (
+                    metadata_prefix, progress['sent'] + 1, timestamp.encode(), len(image_data)
+                )
+                
+                # Send metadata length, metadata, then image data in one
+                # sendmsg, without first copying the image into a joined buffer
+                metadata_len = LENGTH_PREFIX.pack(len(metadata))
+                sendmsg_all(client_socket, (metadata_len, metadata, image_data))
+                
+                # Wait for image acknowledgment with retry
+                if not self.receive_ack(client_socket, 'image_received'):
+                    raise socket.error("Failed to receive valid image acknowledgment")
+                
+                progress['sent'] += 1
+                print(f"Successfully sent image {progress['sent']}")
+                
+        except socket.error as e:
+            print(f"Socket error while sending: {str(e)}")
+            stop_event.set()
+        except Exception as e:
+            print(f"Error during encode/send: {str(e)}")
+            stop_event.set()
+        finally:
+            # Keep consuming so the capture loop never blocks on a full queue
+            if stop_event.is_set():
+                while frame_queue.get() is not None:
+                    pass
+
+    def pin_to_cpu(self, client_socket):
+        """Pin the calling thread to one allowed core, chosen by socket fd"""
+        try:
+            cpus = sorted(self.allowed_cpus)
+            cpu = cpus[client_socket.fileno() % len(cpus)]
+            # pid 0 is the calling thread; threads it starts inherit the mask
+            os.sched_setaffinity(0, {cpu})
+            print(f"Handler pinned to CPU {cpu}")
+        except Exception as e:
+            print(f"Error pinning handler thread: {str(e)}")
+
+    def unpin_from_cpu(self):
+        """Restore the calling thread's mask to the process's allowed cores"""
+        try:
+            os.sched_setaffinity(0, self.allowed_cpus)
+        except Exception as e:
+            print(f"Error unpinning thread: {str(e)}")
+
     def handle_client(self, client_socket, addr):
         """Handle client connection and commands"""
         try:
             print(f"Handling connection from {addr}")
             sys.stdout.flush()
             
+            if self.pin_handlers:
+                self.pin_to_cpu(client_socket)
+            
             # Set initial socket timeout
             client_socket.settimeout(30)
             
@@ -286,6 +491,12 @@ class CameraService:
             print(f"Error checking camera device: {str(e)}")
             sys.stdout.flush()
             return
+        
+        # Open the camera once; capture sessions reuse it
+        if not self.init_camera():
+            print("WARNING: Camera could not be opened, will retry on the first request")
+            sys.stdout.flush()
+        atexit.register(self.release_camera)
 
         server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -308,6 +519,11 @@ class CameraService:
                     sys.stdout.flush()
                     client, addr = server.accept()
                     
+                    # Frames go out as single writes; don't hold them for
+                    # Nagle, and let the kernel queue a whole 720p JPEG
+                    client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    client.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 20)
+                    
                     # Handle each client in a separate thread
                     thread = threading.Thread(
                         target=self.handle_client,
@@ -1,19 +1,59 @@
 from flask import Flask, request, jsonify
-import imaplib
+import base64
 import email
 import smtplib
+from email import encoders
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.image import MIMEImage
 import time
 import requests
+from requests.adapters import HTTPAdapter
 import os
 import json
+import re
 from datetime import datetime
 import threading
+from queue import Queue, Empty, Full
+from imapclient import IMAPClient, SEEN
 
 app = Flask(__name__)
 
+# Email command triggers, matched case-insensitively without lowercasing
+PICTURE_REQUEST_PATTERN = re.compile(r'send pictures for 2 minutes', re.IGNORECASE)
+STATUS_REQUEST_PATTERN = re.compile(r'give latest status', re.IGNORECASE)
+
+# Logged-in SMTP connections kept between messages
+SMTP_POOL_SIZE = 5
+SMTP_MAX_MESSAGES = 100  # recycle a connection after this many sends
+SMTP_IDLE_CHECK = 60  # seconds idle before a pooled connection is NOOP-checked
+
+# Uploads are base64-encoded in blocks of whole 57-byte lines (76 encoded chars)
+ATTACHMENT_BLOCK_SIZE = 57 * 1024
+
+# Fetch only the headers command parsing reads, plus the body; the MIME
+# headers let the body be decoded exactly as the full message would be
+COMMAND_FETCH_PARTS = [
+    'BODY[HEADER.FIELDS (FROM SUBJECT CONTENT-TYPE CONTENT-TRANSFER-ENCODING)]',
+    'BODY[TEXT]'
+]
+
+# Inbox monitoring waits in IMAP IDLE; the timeout re-checks as a safety net
+IMAP_IDLE_TIMEOUT = 5 * 60  # seconds
+
+def encode_attachment(stream):
+    """Base64-encode a file stream block by block, never holding the raw bytes"""
+    # Whole-line blocks make this equal to base64.encodebytes of the full
+    # data, which is what encoders.encode_base64 sets as the payload,
+    # trailing newline included
+    lines = []
+    while True:
+        block = stream.read(ATTACHMENT_BLOCK_SIZE)
+        if not block:
+            break
+        lines.append(base64.encodebytes(block).decode('ascii'))
+    return ''.join(lines)
+
 class EmailHandlerService:
     def __init__(self):
         # Email configuration
@@ -26,6 +66,13 @@ class EmailHandlerService:
         # Image DB service URL using ZeroTier IP
         self.db_service_url = os.getenv('DB_SERVICE_URL', 'http://172.23.228.240:30081')
         
+        # Keep-alive connections to the image DB service
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
+        
+        # Idle (connection, messages sent, last used) SMTP sessions
+        self._smtp_pool = Queue(maxsize=SMTP_POOL_SIZE)
+        
         print(f"Email Handler Service initialized with:")
         print(f"Email: {self.email_address}")
         print(f"DB Service URL: {self.db_service_url}")
@@ -36,20 +83,24 @@ class EmailHandlerService:
         monitor_thread.daemon = True
         monitor_thread.start()
 
-    def check_emails(self):
-        """Check for new emails requesting pictures."""
+    def check_emails(self, mail):
+        """Process unread emails requesting pictures."""
         try:
-            mail = imaplib.IMAP4_SSL(self.imap_server)
-            mail.login(self.email_address, self.email_password)
-            mail.select('inbox')
-            
             # Search for unread emails
-            _, messages = mail.search(None, 'UNSEEN')
+            messages = mail.search('UNSEEN')
+            if not messages:
+                return
             
-            for num in messages[0].split():
-                _, msg = mail.fetch(num, '(RFC822)')
-                email_body = msg[0][1]
-                email_message = email.message_from_bytes(email_body)
+            for num, msg in mail.fetch(messages, COMMAND_FETCH_PARTS).items():
+                # The server may quote the field names in the response key;
+                # a response without headers is parsed as a headerless message
+                headers = next(
+                    (value for key, value in msg.items() if key.startswith(b'BODY[HEADER')),
+                    b''
+                )
+                email_message = email.message_from_bytes(
+                    (headers or b'\r\n') + (msg.get(b'BODY[TEXT]') or b'')
+                )
                 
                 # Get sender email
                 sender = email.utils.parseaddr(email_message['from'])[1]
@@ -70,17 +121,15 @@ class EmailHandlerService:
                 print(f"Body: {body[:100]}...")  # Log first 100 chars of body
                 
                 # Process commands
-                if 'send pictures for 2 minutes' in body.lower():
+                if PICTURE_REQUEST_PATTERN.search(body):
                     print(f"Received picture request from {sender}")
                     self._handle_picture_request(sender)
-                elif 'give latest status' in subject.lower():
+                elif STATUS_REQUEST_PATTERN.search(subject):
                     print(f"Received status request from {sender}")
                     self._handle_status_request(sender)
                 
                 # Mark as read
-                mail.store(num, '+FLAGS', '\\Seen')
-            
-            mail.logout()
+                mail.add_flags(num, [SEEN])
             
         except Exception as e:
             print(f"Error checking emails: {str(e)}")
@@ -89,7 +138,7 @@ class EmailHandlerService:
         """Handle request for pictures."""
         try:
             print(f"Sending capture request to DB service for {requester_email}")
-            response = requests.post(
+            response = self.session.post(
                 f"{self.db_service_url}/start_capture",
                 json={
                     'requester_email': requester_email,
@@ -121,7 +170,7 @@ class EmailHandlerService:
     def _handle_status_request(self, requester_email):
         """Handle request for latest status."""
         try:
-            response = requests.get(f"{self.db_service_url}/health")
+            response = self.session.get(f"{self.db_service_url}/health")
             
             if response.status_code == 200:
                 self._send_confirmation_email(
@@ -151,14 +200,69 @@ class EmailHandlerService:
             msg['Subject'] = subject
             msg.attach(MIMEText(message, 'plain'))
             
-            with smtplib.SMTP_SSL(self.smtp_server, self.smtp_port) as server:
-                server.login(self.email_address, self.email_password)
-                server.send_message(msg)
-                print(f"Sent confirmation email to {recipient}")
+            self.send_email(msg)
+            print(f"Sent confirmation email to {recipient}")
                 
         except Exception as e:
             print(f"Error sending confirmation: {str(e)}")
 
+    def send_email(self, msg):
+        """Send a message over a pooled, already logged-in SMTP connection"""
+        smtp, sent = self._checkout_smtp()
+        try:
+            try:
+                smtp.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                # The server dropped the pooled connection; retry once on a fresh one
+                self._close_smtp(smtp)
+                smtp, sent = self._connect_smtp(), 0
+                smtp.send_message(msg)
+        except Exception:
+            self._close_smtp(smtp)
+            raise
+        self._checkin_smtp(smtp, sent + 1)
+
+    def _connect_smtp(self):
+        """Open and authenticate a new SMTP connection"""
+        smtp = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, timeout=30)
+        smtp.login(self.email_address, self.email_password)
+        return smtp
+
+    def _checkout_smtp(self):
+        """Take a live connection from the pool, or open one if none is idle"""
+        try:
+            smtp, sent, last_used = self._smtp_pool.get_nowait()
+        except Empty:
+            return self._connect_smtp(), 0
+        
+        if time.monotonic() - last_used > SMTP_IDLE_CHECK:
+            try:
+                if smtp.noop()[0] == 250:
+                    return smtp, sent
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close_smtp(smtp)
+            return self._connect_smtp(), 0
+        
+        return smtp, sent
+
+    def _checkin_smtp(self, smtp, sent):
+        """Return a connection to the pool unless it is due for recycling"""
+        if sent >= SMTP_MAX_MESSAGES:
+            self._close_smtp(smtp)
+            return
+        try:
+            self._smtp_pool.put_nowait((smtp, sent, time.monotonic()))
+        except Full:
+            self._close_smtp(smtp)
+
+    def _close_smtp(self, smtp):
+        """Close an SMTP connection, ignoring errors from a dead server"""
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
     def _send_error_email(self, recipient, error_message):
         """Send error notification email."""
         self._send_confirmation_email(
@@ -168,12 +272,23 @@ class EmailHandlerService:
         )
 
     def run(self):
-        """Main service loop."""
+        """Main service loop: wait in IMAP IDLE and process mail as it arrives"""
         print("Starting email monitoring loop...")
         while True:
             try:
-                self.check_emails()
-                time.sleep(10)  # Check every 10 seconds
+                with IMAPClient(self.imap_server, ssl=True) as mail:
+                    mail.login(self.email_address, self.email_password)
+                    mail.select_folder('INBOX')
+                    
+                    while True:
+                        self.check_emails(mail)
+                        
+                        # Block until the server pushes a mailbox change
+                        mail.idle()
+                        try:
+                            mail.idle_check(timeout=IMAP_IDLE_TIMEOUT)
+                        finally:
+                            mail.idle_done()
             except Exception as e:
                 print(f"Error in main loop: {str(e)}")
                 time.sleep(30)  # Wait longer on error
@@ -200,7 +315,7 @@ def send_image():
         try:
             # Create email with image
             msg = MIMEMultipart()
-            msg['From'] = app.config['EMAIL_ADDRESS']
+            msg['From'] = app.email_handler.email_address
             msg['To'] = requester_email
             msg['Subject'] = f'Your Requested Camera Image (Request ID: {request_id})'
             
@@ -216,9 +331,12 @@ def send_image():
             """
             msg.attach(MIMEText(body, 'plain'))
             
-            # Add image attachment with proper filename
-            image_data = image_file.read()
-            image = MIMEImage(image_data)
+            # Add image attachment with proper filename, encoded straight
+            # from the upload stream instead of a full in-memory copy
+            image = MIMEImage(b'', image_file.mimetype.partition('/')[2] or 'jpeg',
+                              _encoder=encoders.encode_noop)
+            image.set_payload(encode_attachment(image_file.stream))
+            image['Content-Transfer-Encoding'] = 'base64'
             # Use the original filename or create one if not available
             filename = image_file.filename or f'camera_image_{request_id}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.jpg'
             image.add_header('Content-Disposition', 'attachment', filename=filename)
@@ -231,11 +349,9 @@ def send_image():
             
             for attempt in range(max_retries):
                 try:
-                    with smtplib.SMTP_SSL('smtp.gmail.com', 465, timeout=30) as smtp:
-                        smtp.login(app.config['EMAIL_ADDRESS'], app.config['EMAIL_PASSWORD'])
-                        smtp.send_message(msg)
-                        print(f"Successfully sent image email to {requester_email} (Attempt {attempt + 1})")
-                        break
+                    app.email_handler.send_email(msg)
+                    print(f"Successfully sent image email to {requester_email} (Attempt {attempt + 1})")
+                    break
                 except Exception as e:
                     if attempt == max_retries - 1:  # Last attempt
                         raise
@@ -279,29 +395,48 @@ def send_image():
             'message': str(e)
         }), 500
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    return jsonify({'status': 'healthy'}), 200
+# Health checks get a constant response, answered before Flask's
+# request dispatch so probes cost almost nothing per hit
+HEALTH_BODY = b'{"status":"healthy"}\n'
+HEALTH_HEADERS = [('Content-Type', 'application/json'), ('Content-Length', str(len(HEALTH_BODY)))]
 
-if __name__ == "__main__":
+def serve_health(wsgi_app):
+    """Wrap a WSGI app so GET /health never reaches Flask"""
+    def health_middleware(environ, start_response):
+        if environ.get('PATH_INFO') == '/health' and environ.get('REQUEST_METHOD') == 'GET':
+            start_response('200 OK', HEALTH_HEADERS)
+            return [HEALTH_BODY]
+        return wsgi_app(environ, start_response)
+    return health_middleware
+
+app.wsgi_app = serve_health(app.wsgi_app)
+
+def init_service():
+    """Create the email handler service and start inbox monitoring"""
     # Initialize email service
     email_service = EmailHandlerService()
     
-    # Verify email credentials
+    # Verify email credentials; the session is kept as the first pooled connection.
+    # Raise rather than exit: under gunicorn this runs in post_fork, where an
+    # exception is a worker boot error that halts the arbiter, while a plain
+    # exit status would only get the worker respawned to log in again
     try:
-        with smtplib.SMTP_SSL('smtp.gmail.com', 465, timeout=10) as smtp:
-            smtp.login(email_service.email_address, email_service.email_password)
-            print("Email credentials verified successfully")
+        email_service._checkin_smtp(email_service._connect_smtp(), 0)
+        print("Email credentials verified successfully")
     except Exception as e:
         print(f"ERROR: Failed to verify email credentials: {str(e)}")
-        sys.exit(1)
+        raise
     
     # Store email configuration in app config
     app.config['EMAIL_ADDRESS'] = email_service.email_address
     app.config['EMAIL_PASSWORD'] = email_service.email_password
+    app.email_handler = email_service
     
     # Start email monitoring in background
     email_service.start_monitoring()
+
+if __name__ == "__main__":
+    init_service()
     
     # Start Flask server
     print("Starting Flask server on ZeroTier network...")
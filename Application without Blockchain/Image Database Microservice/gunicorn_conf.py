@@ -0,0 +1,23 @@
+import multiprocessing
+import os
+
+bind = '172.23.228.240:30081'
+
+# Requests share no in-process state, only the SQLite database in WAL
+# mode, so one prefork worker per core; the master binds the listener
+# once and every worker accepts from that inherited socket
+workers = int(os.getenv('GUNICORN_WORKERS', str(multiprocessing.cpu_count())))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+keepalive = 30
+
+# A capture session holds its /start_capture request open while images arrive
+timeout = 300
+
+def on_starting(server):
+    """Create the schema once in the master, before any worker forks"""
+    # Importing the app opens no database connection (they are opened per
+    # thread on first use) and init_db closes its own, so no SQLite handle
+    # is inherited across the fork
+    from image_db_service import init_db
+    init_db()
@@ -1,23 +1,170 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import Flask, request, jsonify
 import os
 from datetime import datetime
 import sqlite3
 import json
 import socket  # Added for camera service communication
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 app = Flask(__name__)
 
 DB_PATH = '/app/data/images.db'
 IMAGES_DIR = '/app/images'
 
+# Images recorded per insert transaction during a capture session
+IMAGE_BATCH_SIZE = 16
+
+# Rows per multi-row image INSERT, within SQLite's default limit of
+# 999 bound parameters per statement
+IMAGE_ROWS_PER_INSERT = 999 // 3
+
+# Request threads each keep one open database connection
+_db_local = threading.local()
+
+# Page cache per connection, in KiB; with a connection per thread in
+# every worker this is multiplied many times over, so keep it small
+SQLITE_CACHE_KIB = int(os.getenv('SQLITE_CACHE_KIB', '4096'))
+
+# Hot-path statements; reusing the same text lets each connection's
+# statement cache skip re-parsing and re-planning them. Image rows are
+# inserted with one (?, ?, ?) group per row appended to the prefix
+SQL_INSERT_IMAGES = '''
+    INSERT INTO images (request_id, image_path, created_at)
+    VALUES '''
+SQL_INSERT_REQUEST = '''
+    INSERT INTO requests (timestamp, requester_email, status, created_at)
+    VALUES (?, ?, ?, ?)
+'''
+
+# Keep-alive connections to the email handler, reused across images;
+# connections found dead between sessions are re-established
+SESSION = requests.Session()
+SESSION.mount('http://', HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=4,
+    max_retries=Retry(total=2, backoff_factor=0.2)
+))
+
+# Images are posted to the email handler off the camera receive loop;
+# pending posts are finished when the interpreter exits
+EMAIL_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix='email-post')
+
+# Camera messages are preceded by their length as a 4-byte big-endian integer
+LENGTH_PREFIX = struct.Struct('!I')
+
+# Initial receive buffer; a frame's prefix, metadata and image usually
+# arrive together in one recv into it
+RECV_BUFFER_SIZE = 256 * 1024
+
+# Image files are written through a raw descriptor, so received bytes go
+# to the kernel without passing through a BufferedWriter; Python opens
+# descriptors close-on-exec already
+IMAGE_FILE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+
+def write_all(fd, data):
+    """Write all of data to a raw file descriptor, resuming after short writes"""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+class FramedReader:
+    """Buffered reader that frames camera messages out of large recv calls"""
+    
+    def __init__(self, sock, size=RECV_BUFFER_SIZE):
+        self.sock = sock
+        self.buf = bytearray(size)
+        self.start = 0  # first unread byte
+        self.end = 0    # end of received data
+    
+    def recv_into(self, view):
+        """Receive at least one byte into view"""
+        n = self.sock.recv_into(view)
+        if not n:
+            raise Exception("Connection closed by camera service")
+        return n
+    
+    def fill(self, size):
+        """Receive until at least size (at most the buffer size) bytes are unread"""
+        available = self.end - self.start
+        if self.start + size > len(self.buf):
+            # Move unread bytes to the front to make room
+            self.buf[:available] = self.buf[self.start:self.end]
+            self.start, self.end = 0, available
+        
+        view = memoryview(self.buf)
+        while self.end - self.start < size:
+            self.end += self.recv_into(view[self.end:])
+    
+    def read_exact(self, size, out_fd=None):
+        """Return exactly size bytes from the stream in a new bytearray
+        
+        If out_fd is given, the bytes are also written to that file
+        descriptor as they arrive, so disk writes overlap the transfer.
+        """
+        data = bytearray(size)
+        view = memoryview(data)
+        
+        # Take whatever is already buffered
+        received = min(size, self.end - self.start)
+        view[:received] = memoryview(self.buf)[self.start:self.start + received]
+        self.start += received
+        
+        if size - received >= len(self.buf):
+            # Large payloads are received straight into their final buffer
+            if out_fd is not None:
+                write_all(out_fd, view[:received])
+            while received < size:
+                n = self.recv_into(view[received:])
+                if out_fd is not None:
+                    write_all(out_fd, view[received:received + n])
+                received += n
+        else:
+            if received < size:
+                self.fill(size - received)
+                view[received:] = memoryview(self.buf)[self.start:self.start + size - received]
+                self.start += size - received
+            if out_fd is not None:
+                write_all(out_fd, data)
+        return data
+    
+    def read_message(self):
+        """Return one length-prefixed message from the camera service"""
+        size, = LENGTH_PREFIX.unpack(self.read_exact(LENGTH_PREFIX.size))
+        return self.read_exact(size)
+
+def connect_db():
+    """Open the database; WAL with synchronous=NORMAL avoids an fsync per commit"""
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # Per-connection page cache; the 256 MiB read mapping is shared
+    # through the OS page cache rather than allocated per connection
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KIB}")
+    conn.execute("PRAGMA mmap_size=268435456")
+    return conn
+
+def get_db():
+    """This thread's database connection, opened on first use and kept open"""
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None:
+        conn = _db_local.conn = connect_db()
+    return conn
+
 def init_db():
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
     os.makedirs(IMAGES_DIR, exist_ok=True)
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect_db()
     c = conn.cursor()
     
+    # Persistent for the database file, so set once here
+    c.execute("PRAGMA journal_mode=WAL")
+    
     c.execute('''
         CREATE TABLE IF NOT EXISTS requests
         (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -36,29 +183,39 @@ def init_db():
          FOREIGN KEY (request_id) REFERENCES requests (id))
     ''')
     
+    c.execute('CREATE INDEX IF NOT EXISTS idx_images_req ON images(request_id)')
+    
     conn.commit()
     conn.close()
 
-def send_to_email_service(image_data, filename, requester_email, request_id):
-    """Send image to email handler service"""
+def insert_images(request_id, images):
+    """Record (image_path, created_at) rows for a request in one transaction"""
+    with get_db() as conn:
+        for start in range(0, len(images), IMAGE_ROWS_PER_INSERT):
+            rows = images[start:start + IMAGE_ROWS_PER_INSERT]
+            conn.execute(
+                SQL_INSERT_IMAGES + ', '.join(['(?, ?, ?)'] * len(rows)),
+                [value for image_path, created_at in rows
+                 for value in (request_id, image_path, created_at)]
+            )
+
+def send_to_email_service(filepath, filename, requester_email, request_id):
+    """Send a saved image file to email handler service"""
     try:
-        # Create files dictionary with image data
-        files = {
-            'image': (filename, image_data, 'image/jpeg')
-        }
-        
         # Create form data
         form_data = {
             'requester_email': requester_email,
             'request_id': request_id
         }
         
-        # Send to email handler service
-        response = requests.post(
-            'http://172.23.228.240:30082/send_image',  # Email handler service address
-            files=files,
-            data=form_data
-        )
+        # Upload from the saved file, read back from the page cache at send
+        # time, so queued images do not keep their receive buffers alive
+        with open(filepath, 'rb') as image_file:
+            response = SESSION.post(
+                'http://172.23.228.240:30082/send_image',  # Email handler service address
+                files={'image': (filename, image_file, 'image/jpeg')},
+                data=form_data
+            )
         
         if response.status_code == 200:
             print(f"Successfully sent image {filename} to email service")
@@ -74,6 +231,7 @@ def send_to_email_service(image_data, filename, requester_email, request_id):
 def connect_to_camera_service(request_id, requester_email):
     """Connect to camera service and request image capture"""
     camera_socket = None
+    stored_images = []  # written to the database in batches of IMAGE_BATCH_SIZE
     try:
         # Create socket connection to camera service
         camera_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -91,11 +249,9 @@ def connect_to_camera_service(request_id, requester_email):
         camera_socket.sendall(json.dumps(command).encode())
         print(f"Sent capture command to camera service for request {request_id}")
         
-        # Receive start message length
-        msg_len = int(camera_socket.recv(8).decode())
-        # Receive start message
-        start_message = camera_socket.recv(msg_len).decode()
-        start_data = json.loads(start_message)
+        # Receive length-prefixed start message
+        reader = FramedReader(camera_socket)
+        start_data = json.loads(reader.read_message())
         
         if start_data.get('type') == 'start':
             # Send acknowledgment
@@ -106,53 +262,36 @@ def connect_to_camera_service(request_id, requester_email):
             # Start receiving images
             while True:
                 try:
-                    # Receive metadata length
-                    metadata_len = int(camera_socket.recv(8).decode())
-                    # Receive metadata
-                    metadata = camera_socket.recv(metadata_len).decode()
-                    metadata_json = json.loads(metadata)
+                    # Receive length-prefixed metadata
+                    metadata_json = json.loads(reader.read_message())
                     
                     if metadata_json.get('type') == 'end':
                         print(f"Received end message. Total images: {metadata_json.get('total_images')}")
                         break
                         
                     if metadata_json.get('type') == 'image':
-                        image_size = metadata_json.get('size')
-                        
-                        # Create a buffer for the image
-                        image_data = bytearray()
-                        remaining = image_size
-                        
-                        # Receive image data in chunks
-                        while remaining > 0:
-                            chunk_size = min(remaining, 8192)
-                            chunk = camera_socket.recv(chunk_size)
-                            if not chunk:
-                                raise Exception("Connection broken while receiving image")
-                            image_data.extend(chunk)
-                            remaining -= len(chunk)
-                        
-                        # Save the image
-                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                        # One clock read names the file and stamps its row
+                        now = datetime.now()
+                        timestamp = now.strftime('%Y%m%d_%H%M%S')
                         filename = f"image_{request_id}_{timestamp}.jpg"
                         filepath = os.path.join(IMAGES_DIR, filename)
                         
-                        with open(filepath, 'wb') as f:
-                            f.write(image_data)
+                        # Save the image while it is still arriving
+                        fd = os.open(filepath, IMAGE_FILE_FLAGS, 0o644)
+                        try:
+                            reader.read_exact(metadata_json.get('size'), out_fd=fd)
+                        finally:
+                            os.close(fd)
                         
-                        # Update database
-                        conn = sqlite3.connect(DB_PATH)
-                        c = conn.cursor()
-                        c.execute('''
-                            INSERT INTO images (request_id, image_path, created_at)
-                            VALUES (?, ?, ?)
-                        ''', (request_id, filepath, datetime.now().isoformat()))
-                        conn.commit()
-                        conn.close()
+                        stored_images.append((filepath, now.isoformat()))
+                        if len(stored_images) >= IMAGE_BATCH_SIZE:
+                            insert_images(request_id, stored_images)
+                            stored_images = []
                         
-                        # Send to email service
+                        # Queue for the email service; the camera is acked
+                        # without waiting on the HTTP round trip
                         print(f"Sending image {filename} to email service...")
-                        send_to_email_service(image_data, filename, requester_email, request_id)
+                        EMAIL_EXECUTOR.submit(send_to_email_service, filepath, filename, requester_email, request_id)
                         
                         # Send image acknowledgment
                         image_ack = json.dumps({"image_received": True}).encode()
@@ -177,6 +316,13 @@ def connect_to_camera_service(request_id, requester_email):
                 camera_socket.close()
         except:
             pass
+        
+        # Update database
+        if stored_images:
+            try:
+                insert_images(request_id, stored_images)
+            except Exception as e:
+                print(f"Error recording images for request {request_id}: {str(e)}")
 
 @app.route('/start_capture', methods=['POST'])
 def start_capture():
@@ -187,14 +333,11 @@ def start_capture():
         
         print(f"Received capture request for {requester_email}")
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         c = conn.cursor()
         
         # Store the request
-        c.execute('''
-            INSERT INTO requests (timestamp, requester_email, status, created_at)
-            VALUES (?, ?, ?, ?)
-        ''', (
+        c.execute(SQL_INSERT_REQUEST, (
             timestamp,
             requester_email,
             'pending',
@@ -203,7 +346,6 @@ def start_capture():
         
         request_id = c.lastrowid
         conn.commit()
-        conn.close()
         
         print(f"Created request with ID: {request_id}")
         
@@ -245,7 +387,8 @@ def store_image():
             return jsonify({'status': 'error', 'message': 'No request ID'}), 400
             
         # Generate filename with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        now = datetime.now()
+        timestamp = now.strftime('%Y%m%d_%H%M%S')
         filename = f"image_{request_id}_{timestamp}.jpg"
         filepath = os.path.join(IMAGES_DIR, filename)
         
@@ -253,16 +396,7 @@ def store_image():
         image_file.save(filepath)
         
         # Update database
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        
-        c.execute('''
-            INSERT INTO images (request_id, image_path, created_at)
-            VALUES (?, ?, ?)
-        ''', (request_id, filepath, datetime.now().isoformat()))
-        
-        conn.commit()
-        conn.close()
+        insert_images(request_id, [(filepath, now.isoformat())])
         
         return jsonify({
             'status': 'success',
@@ -277,9 +411,21 @@ def store_image():
             'message': str(e)
         }), 500
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    return jsonify({'status': 'healthy'}), 200
+# Health checks get a constant response, answered before Flask's
+# request dispatch so probes cost almost nothing per hit
+HEALTH_BODY = b'{"status":"healthy"}\n'
+HEALTH_HEADERS = [('Content-Type', 'application/json'), ('Content-Length', str(len(HEALTH_BODY)))]
+
+def serve_health(wsgi_app):
+    """Wrap a WSGI app so GET /health never reaches Flask"""
+    def health_middleware(environ, start_response):
+        if environ.get('PATH_INFO') == '/health' and environ.get('REQUEST_METHOD') == 'GET':
+            start_response('200 OK', HEALTH_HEADERS)
+            return [HEALTH_BODY]
+        return wsgi_app(environ, start_response)
+    return health_middleware
+
+app.wsgi_app = serve_health(app.wsgi_app)
 
 if __name__ == '__main__':
     # Initialize database at startup
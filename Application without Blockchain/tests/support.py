@@ -0,0 +1,19 @@
+"""Shared fixtures: load service modules by path"""
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMAIL_DIR = os.path.join(ROOT, 'Email Handler Microservice')
+
+def load_module(name, directory, filename=None):
+    """Import a service module by file path, with its directory importable"""
+    if name in sys.modules:
+        return sys.modules[name]
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(directory, filename or f'{name}.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,36 @@
+"""check_emails keeps processing a batch past a malformed fetch response"""
+import unittest
+from unittest import mock
+
+from support import EMAIL_DIR, load_module
+
+email_handler_service = load_module('email_handler_service', EMAIL_DIR)
+
+HEADER_KEY = b'BODY[HEADER.FIELDS ("FROM" "SUBJECT")]'
+
+class CheckEmailsTest(unittest.TestCase):
+    def setUp(self):
+        self.handler = email_handler_service.EmailHandlerService.__new__(
+            email_handler_service.EmailHandlerService
+        )
+        self.handler._handle_picture_request = mock.Mock()
+        self.handler._handle_status_request = mock.Mock()
+
+    def test_message_without_headers_does_not_drop_the_rest(self):
+        mail = mock.Mock()
+        mail.search.return_value = [1, 2]
+        mail.fetch.return_value = {
+            1: {b'BODY[TEXT]': b'stray body'},
+            2: {
+                HEADER_KEY: b'From: user@example.com\r\nSubject: hi\r\n\r\n',
+                b'BODY[TEXT]': b'Send pictures for 2 minutes'
+            }
+        }
+
+        self.handler.check_emails(mail)
+
+        self.handler._handle_picture_request.assert_called_once_with('user@example.com')
+        self.assertEqual([call.args[0] for call in mail.add_flags.call_args_list], [1, 2])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+"""encode_attachment produces the same MIME part as encoders.encode_base64"""
+import io
+import os
+import unittest
+from email import encoders
+from email.mime.image import MIMEImage
+
+from support import EMAIL_DIR, load_module
+
+email_handler_service = load_module('email_handler_service', EMAIL_DIR)
+
+BLOCK = email_handler_service.ATTACHMENT_BLOCK_SIZE
+
+class EncodeAttachmentTest(unittest.TestCase):
+    def assert_same_part(self, data):
+        expected = MIMEImage(data, 'jpeg')
+
+        streamed = MIMEImage(b'', 'jpeg', _encoder=encoders.encode_noop)
+        streamed.set_payload(email_handler_service.encode_attachment(io.BytesIO(data)))
+        streamed['Content-Transfer-Encoding'] = 'base64'
+
+        self.assertEqual(streamed.as_bytes(), expected.as_bytes())
+
+    def test_matches_encode_base64(self):
+        for size in (1, 56, 57, 58, 5000, BLOCK - 1, BLOCK, BLOCK + 1, 3 * BLOCK + 7):
+            with self.subTest(size=size):
+                self.assert_same_part(os.urandom(size))
+
+    def test_matches_encode_base64_for_data_ending_in_newline(self):
+        self.assert_same_part(os.urandom(BLOCK + 10) + b'\n')
+        self.assert_same_part(os.urandom(BLOCK - 1) + b'\n')
+
+    def test_empty_stream(self):
+        self.assertEqual(email_handler_service.encode_attachment(io.BytesIO(b'')), '')
+
+if __name__ == '__main__':
+    unittest.main()